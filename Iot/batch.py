@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import glob
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import cv2
+
+import process
+from config import PROCESS_CONFIG
+
+# 批量模式支持的文件类型
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# 从文件路径中识别停车场层数，例如 layerb1_1.png、b2/video.mp4
+LAYER_PATTERN = re.compile(r'(?:^|[^a-z0-9])(?:layer)?(b[1-3])(?:[^a-z0-9]|$)', re.IGNORECASE)
+
+def collect_sources(inputs):
+    """
+    展开目录和通配符，收集需要处理的图片和视频文件
+
+    Args:
+        inputs: 目录、文件或通配符列表
+
+    Returns:
+        sources: 按路径排序去重后的文件列表
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, name) for name in files)
+        else:
+            paths.extend(glob.glob(item, recursive=True))
+
+    media_extensions = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+    return sorted({path for path in paths if path.lower().endswith(media_extensions)})
+
+def infer_layer(path, default_layer=None):
+    """
+    根据文件路径推断停车场层数，无法识别时返回默认层数
+
+    Args:
+        path: 文件路径
+        default_layer: 默认层数，默认使用配置中的层数
+
+    Returns:
+        parking_layer: 小写的层数，例如 'b1'
+    """
+    # 优先匹配文件名，其次匹配所在目录
+    for part in reversed(os.path.normpath(path).split(os.sep)):
+        match = LAYER_PATTERN.search(part)
+        if match:
+            return match.group(1).lower()
+    return default_layer or PROCESS_CONFIG['parking_layer']
+
+def _init_worker():
+    """工作进程初始化：每个进程只用一个OpenCV线程，避免多进程下线程过度订阅"""
+    cv2.setNumThreads(1)
+
+def analyze_source(path, parking_layer):
+    """
+    在工作进程中处理一个图片或视频文件
+
+    结果图像直接在工作进程中保存，只把分析数据传回主进程，避免跨进程传输整帧图像。
+
+    Args:
+        path: 文件路径
+        parking_layer: 该文件所属的停车场层数
+
+    Returns:
+        path: 文件路径
+        parking_layer: 停车场层数
+        source_type: 'image' 或 'video'
+        records: 按时间顺序排列的分析结果列表
+    """
+    records = []
+
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        source_type = 'image'
+        result_image, free_count, free_slots, total_slots, rows_count, columns_count = process.process_image(path)
+        timestamp = datetime.now()
+
+        info_text = f"File: {os.path.basename(path)} | Layer: {parking_layer} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
+        extended_image = process.add_info_bar(result_image, info_text)
+        saved_path = process.save_result_image(extended_image, 'image', timestamp.strftime("%Y%m%d_%H%M%S"), path)
+
+        records.append({
+            'timestamp': timestamp,
+            'frame_time': None,
+            'total_slots': total_slots,
+            'free_count': free_count,
+            'free_slots': free_slots,
+            'rows_count': rows_count,
+            'columns_count': columns_count,
+            'saved_path': saved_path
+        })
+    else:
+        source_type = 'video'
+        for timestamp, result_image, free_count, free_slots, frame_time, total_slots, rows_count, columns_count in process.process_video(path, parking_layer):
+            info_text = f"Frame: {len(records)+1} | Time: {int(frame_time)}s | Layer: {parking_layer} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
+            extended_image = process.add_info_bar(result_image, info_text)
+            saved_path = process.save_result_image(
+                extended_image,
+                'video',
+                timestamp=datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S"),
+                original_path=path,
+                frame_time=frame_time
+            )
+
+            records.append({
+                'timestamp': timestamp,
+                'frame_time': frame_time,
+                'total_slots': total_slots,
+                'free_count': free_count,
+                'free_slots': free_slots,
+                'rows_count': rows_count,
+                'columns_count': columns_count,
+                'saved_path': saved_path
+            })
+
+    return path, parking_layer, source_type, records
+
+def run_batch(sources, workers=None, default_layer=None):
+    """
+    使用进程池并行处理多个文件
+
+    同时在途的任务数量限制为工作进程数的两倍，避免一次性提交大量任务占用内存。
+    每个文件由一个工作进程完整处理，因此同一文件的结果始终按时间顺序返回。
+
+    Args:
+        sources: 文件路径列表
+        workers: 工作进程数，默认为CPU核心数
+        default_layer: 无法从路径识别层数时使用的层数
+
+    Yields:
+        (path, parking_layer, source_type, records, error)，处理失败时records为空且error为异常信息
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    pending = {}
+    source_iter = iter(sources)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        while True:
+            # 补充任务，直到在途任务达到上限
+            for path in source_iter:
+                parking_layer = infer_layer(path, default_layer)
+                future = executor.submit(analyze_source, path, parking_layer)
+                pending[future] = (path, parking_layer)
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, parking_layer = pending.pop(future)
+                try:
+                    _, _, source_type, records = future.result()
+                except Exception as e:
+                    yield path, parking_layer, None, [], e
+                else:
+                    yield path, parking_layer, source_type, records, None
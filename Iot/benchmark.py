@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+检测流程基准测试
+
+使用仓库自带的 origin/images/layerb*_*.png 和 origin/videos/video1.mp4，
+分阶段统计耗时（解码、车位检测、状态判断、标注、保存图片、上传到本地桩数据库），
+并输出每秒处理帧数和进程峰值内存，结果为JSON，便于在不同提交之间比较。
+
+用法:
+    python benchmark.py --repeat 5 --output bench.json
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import process
+import upload
+from config import PROCESS_CONFIG
+
+try:
+    import resource
+except ImportError:
+    # Windows没有resource模块，不统计峰值内存
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGES = os.path.join(BASE_DIR, 'origin', 'images', 'layerb*_*.png')
+DEFAULT_VIDEO = os.path.join(BASE_DIR, 'origin', 'videos', 'video1.mp4')
+
+# 一帧的处理阶段，按流水线顺序排列
+STAGES = ('decode', 'detect', 'classify', 'check_slot_status_loop', 'annotate', 'save', 'upload')
+
+class StubCursor:
+    """把上传模块生成的MySQL语句改写为SQLite语句执行"""
+
+    def __init__(self, connection):
+        self._cursor = connection.cursor()
+        self.lastrowid = None
+
+    @staticmethod
+    def _translate(query):
+        # 'col = col'形式的更新只用于去重，对应OR IGNORE；其余的更新（最新状态快照）对应OR REPLACE
+        match = re.search(r'\s+ON DUPLICATE KEY UPDATE\s+(.*)$', query.strip(), flags=re.DOTALL)
+        conflict = 'OR IGNORE'
+        if match:
+            query = query.strip()[:match.start()]
+            if not re.fullmatch(r'(\w+) = \1', match.group(1).strip()):
+                conflict = 'OR REPLACE'
+        query = query.replace('INSERT INTO', f'INSERT {conflict} INTO', 1)
+        return query.replace('%s', '?')
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._translate(query), params)
+        self.lastrowid = self._cursor.lastrowid
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(self._translate(query), rows)
+        self.lastrowid = None
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def close(self):
+        self._cursor.close()
+
+class StubConnection:
+    """与连接池借出的连接接口一致的SQLite连接，close()时什么也不做"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return StubCursor(self._connection)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        pass
+
+class StubPool:
+    """
+    本地桩数据库连接池
+
+    用SQLite文件代替MySQL，只创建上传时写入的数据表，用于测量上传路径本身的开销
+    （参数组装、SQL执行和事务提交），不受网络和数据库服务器的影响。
+    """
+
+    def __init__(self, path, layers):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {upload.LATEST_TABLE} (
+                parking_layer TEXT PRIMARY KEY,
+                status_id INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                total_slots INTEGER NOT NULL,
+                free_slots INTEGER NOT NULL,
+                free_positions TEXT,
+                parking_rows INTEGER,
+                parking_columns INTEGER,
+                reservation TEXT,
+                source_type TEXT NOT NULL,
+                record_uid TEXT,
+                free_bitmap BLOB
+            )
+        """)
+        for parking_layer in layers:
+            self._connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS parking_status_{parking_layer} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    total_slots INTEGER NOT NULL,
+                    free_slots INTEGER NOT NULL,
+                    free_positions TEXT NOT NULL,
+                    source_type TEXT NOT NULL,
+                    parking_rows INTEGER,
+                    parking_columns INTEGER,
+                    reservation TEXT,
+                    record_uid TEXT UNIQUE,
+                    free_bitmap BLOB
+                )
+            """)
+            self._connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS parking_events_{parking_layer} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    slot_number INTEGER NOT NULL,
+                    is_free INTEGER NOT NULL,
+                    record_uid TEXT NOT NULL,
+                    UNIQUE (record_uid, slot_number)
+                )
+            """)
+        self._connection.commit()
+
+    def get_connection(self):
+        return StubConnection(self._connection)
+
+    def close(self):
+        self._connection.close()
+
+def open_stub_database(path, parking_layer):
+    """
+    创建写入本地桩数据库的ParkingDatabase
+
+    Args:
+        path: SQLite文件路径
+        parking_layer: 停车场层数
+
+    Returns:
+        db: ParkingDatabase实例（逐条写入、不使用本地缓存）
+        pool: 桩连接池，测试结束后关闭
+    """
+    pool = StubPool(path, [parking_layer])
+    upload.get_connection_pool = lambda: pool
+    # 桩数据库的表已创建，跳过结构版本检查
+    upload._checked_tables.add(f"parking_status_{parking_layer}")
+    upload.UPLOAD_CONFIG['spool_path'] = None
+    db = upload.ParkingDatabase(parking_layer, buffered=False, delta_mode=False)
+    return db, pool
+
+def peak_rss_kb():
+    """进程峰值常驻内存（KB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上ru_maxrss的单位是字节，Linux上是KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def summarize(samples):
+    """
+    汇总一个阶段的耗时
+
+    Args:
+        samples: 每帧的耗时列表（秒）
+
+    Returns:
+        包含次数、总耗时、平均值、中位数、p95、最小值和最大值（毫秒）的字典
+    """
+    if not samples:
+        return {'count': 0}
+    values = np.array(samples) * 1000
+    return {
+        'count': len(values),
+        'total_ms': round(float(values.sum()), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'median_ms': round(float(np.median(values)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'min_ms': round(float(values.min()), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+class StageTimer:
+    """按阶段累计每帧耗时"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.frame_totals = []
+        self._frame_total = 0.0
+
+    def measure(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def add(self, stage, elapsed):
+        self.samples[stage].append(elapsed)
+        # check_slot_status逐个调用只作为对照，不计入一帧的总耗时
+        if stage != 'check_slot_status_loop':
+            self._frame_total += elapsed
+
+    def end_frame(self):
+        self.frame_totals.append(self._frame_total)
+        self._frame_total = 0.0
+
+    def report(self):
+        total_seconds = sum(self.frame_totals)
+        return {
+            'frames': len(self.frame_totals),
+            'fps': round(len(self.frame_totals) / total_seconds, 3) if total_seconds else None,
+            'frame_total': summarize(self.frame_totals),
+            'stages': {stage: summarize(samples) for stage, samples in self.samples.items()}
+        }
+
+def run_frame(timer, frame, db, output_file, source_type):
+    """对已解码的一帧依次执行检测、状态判断、标注、保存和上传"""
+    slots, rows_count, columns_count = timer.measure('detect', process.detect_parking_slots, frame)
+    statuses = timer.measure('classify', process.classify_slots, frame, slots)
+    timer.measure('check_slot_status_loop', lambda: [process.check_slot_status(frame, slot) for slot in slots])
+
+    free_slots = [i + 1 for i, (is_free, _) in enumerate(statuses) if is_free]
+    info_text = f"Benchmark | Free: {len(free_slots)} | Grid: {rows_count}x{columns_count}"
+    extended_image = timer.measure(
+        'annotate',
+        lambda: process.add_info_bar(process.draw_slot_labels(frame, slots, statuses), info_text)
+    )
+    timer.measure('save', process.write_result_image, extended_image, output_file)
+    timer.measure(
+        'upload', db.upload_result,
+        timestamp=time.time(),
+        total_slots=len(slots),
+        free_slots=len(free_slots),
+        free_positions=free_slots,
+        source_type=source_type,
+        parking_rows=rows_count,
+        parking_columns=columns_count
+    )
+    timer.end_frame()
+
+def benchmark_images(paths, repeat, db, output_dir):
+    """每张图片处理repeat次"""
+    timer = StageTimer()
+    for _ in range(repeat):
+        for path in paths:
+            frame = timer.measure('decode', cv2.imread, path)
+            if frame is None:
+                raise ValueError(f"无法读取图片: {path}")
+            name = os.path.splitext(os.path.basename(path))[0]
+            run_frame(timer, frame, db, os.path.join(output_dir, f'{name}.png'), 'image')
+    return timer.report()
+
+def benchmark_video(path, repeat, db, output_dir):
+    """按视频模式的间隔抽帧处理，整个视频重复repeat次"""
+    timer = StageTimer()
+    for _ in range(repeat):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"无法打开视频: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_interval = max(1, int(fps * PROCESS_CONFIG.get('video_interval', 10)))
+        seek_mode = PROCESS_CONFIG.get('video_seek_mode', 'grab')
+        frame_count = 0
+        next_frame = 1
+
+        try:
+            while True:
+                # 解码阶段包括跳过两次分析之间的帧
+                start = time.perf_counter()
+                ret, frame = False, None
+                if process.skip_frames(cap, next_frame - 1 - frame_count, seek_mode):
+                    ret, frame = cap.read()
+                if not ret:
+                    # 视频结束时的读取不算作一帧
+                    break
+                timer.add('decode', time.perf_counter() - start)
+                frame_count = next_frame
+                run_frame(timer, frame, db, os.path.join(output_dir, f'video_{frame_count}.png'), 'video')
+                next_frame = (frame_count // frame_interval + 1) * frame_interval
+        finally:
+            cap.release()
+    return timer.report()
+
+def git_revision():
+    """当前提交的短哈希，不在git仓库中时返回None"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="停车场车位识别流程基准测试")
+    parser.add_argument("--images", default=DEFAULT_IMAGES, help="图片通配符，默认使用自带的分层图片")
+    parser.add_argument("--video", default=DEFAULT_VIDEO, help="视频路径，默认使用自带的视频")
+    parser.add_argument("--skip-video", action="store_true", help="只测试图片")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，默认5")
+    parser.add_argument("--warmup", type=int, default=1, help="正式计时前的预热次数，默认1")
+    parser.add_argument("--threads", type=int, default=None, help="OpenCV线程数，默认不修改")
+    parser.add_argument("--output", default=None, help="JSON结果文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        parser.error(f"没有找到图片: {args.images}")
+
+    # 上传的记录写入临时SQLite，结果图片写入临时目录，不影响 results/ 和真实数据库；
+    # 各模块的运行日志转到标准错误，标准输出只有JSON结果
+    with tempfile.TemporaryDirectory(prefix='parking_bench_') as work_dir, redirect_stdout(sys.stderr):
+        db, pool = open_stub_database(os.path.join(work_dir, 'stub.db'), 'bench')
+        try:
+            # 预热：首次调用时的库加载和内存分配不计入结果
+            if args.warmup:
+                benchmark_images(paths, args.warmup, db, work_dir)
+
+            results = {
+                'meta': {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'git_revision': git_revision(),
+                    'python': platform.python_version(),
+                    'opencv': cv2.__version__,
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'cpu_count': os.cpu_count(),
+                    'opencv_threads': cv2.getNumThreads(),
+                    'repeat': args.repeat,
+                    'analysis_scale': PROCESS_CONFIG.get('analysis_scale', 1.0),
+                    'output_format': process.OUTPUT_CONFIG.get('format', 'png')
+                },
+                'images': dict(
+                    files=[os.path.relpath(path, BASE_DIR) for path in paths],
+                    **benchmark_images(paths, args.repeat, db, work_dir)
+                )
+            }
+            if not args.skip_video:
+                results['video'] = dict(
+                    file=os.path.relpath(args.video, BASE_DIR),
+                    **benchmark_video(args.video, args.repeat, db, work_dir)
+                )
+        finally:
+            db.close()
+            pool.close()
+
+    results['peak_rss_kb'] = peak_rss_kb()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"基准测试结果已保存至: {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import metrics
+
+class LatestFrameGrabber:
+    """
+    后台取帧线程
+
+    摄像头驱动会缓存若干帧，处理间隔较长时直接cap.read()拿到的是缓冲区中积压的旧画面。
+    取帧线程持续读取摄像头，只保留最新的一帧，其余帧直接丢弃；
+    处理时总是拿到最新画面及其采集时间，主线程也不再需要逐帧解码。
+    """
+
+    def __init__(self, cap):
+        """
+        Args:
+            cap: 已打开的cv2.VideoCapture，停止时由取帧线程释放
+        """
+        self.cap = cap
+        self._cond = threading.Condition()
+        self._frame = None
+        self._capture_time = None
+        self._seq = 0
+        self._read_seq = 0
+        self._ended = False
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+
+        # 取帧指标
+        self.frames_grabbed = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def read(self, timeout=None):
+        """
+        获取尚未读取过的最新一帧，没有新帧时等待
+
+        Args:
+            timeout: 最长等待秒数，None表示一直等待
+
+        Returns:
+            ret: 是否获取到新帧（摄像头断开或等待超时时为False）
+            frame: 最新的一帧
+            capture_time: 该帧的采集时间戳
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._read_seq or self._ended, timeout)
+            if self._seq == self._read_seq:
+                return False, None, None
+            self._read_seq = self._seq
+            return True, self._frame, self._capture_time
+
+    def stop(self):
+        """停止取帧线程并释放摄像头"""
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.cap.release()
+
+    def _run(self):
+        """取帧线程主循环"""
+        try:
+            while not self._stop_event.is_set():
+                with metrics.stage_timer('decode'):
+                    ret, frame = self.cap.read()
+                capture_time = time.time()
+                if not ret:
+                    break
+                with self._cond:
+                    # 上一帧还没有被读取就被覆盖，计为丢弃
+                    if self._seq > self._read_seq:
+                        self.frames_dropped += 1
+                        metrics.FRAMES_DROPPED.inc(reason='stale')
+                    self._frame = frame
+                    self._capture_time = capture_time
+                    self._seq += 1
+                    self.frames_grabbed += 1
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+import process
+import metrics
+from process import OUTPUT_CONFIG
+
+# 保留策略统计的图片类型
+RESULT_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# 通知写入线程退出的哨兵
+_STOP = object()
+
+class RetentionIndex:
+    """
+    单个输出目录的保留策略
+
+    启动时扫描一次目录，之后在内存中按写入顺序记录文件及其大小，
+    超过数量或字节上限时删除最旧的文件，不需要每次写入都重新扫描目录。
+    """
+
+    def __init__(self, output_dir, max_files=None, max_bytes=None):
+        """
+        Args:
+            output_dir: 输出目录
+            max_files: 最多保留的图片数，None为不限制
+            max_bytes: 最多占用的字节数，None为不限制
+        """
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.removed = 0
+        self._files = OrderedDict()
+
+        # 已有文件按修改时间从旧到新排列
+        entries = []
+        if os.path.isdir(output_dir):
+            for entry in os.scandir(output_dir):
+                if entry.is_file() and entry.name.lower().endswith(RESULT_EXTENSIONS):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._files[path] = size
+            self.total_bytes += size
+
+    def add(self, path, size):
+        """记录新写入的文件（覆盖同名文件时视为最新），然后执行保留策略"""
+        self.total_bytes -= self._files.pop(path, 0)
+        self._files[path] = size
+        self.total_bytes += size
+        self.enforce()
+
+    def enforce(self):
+        """删除最旧的文件，直到满足数量和字节上限（始终保留最新的一张）"""
+        while len(self._files) > 1 and (
+            (self.max_files is not None and len(self._files) > self.max_files)
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            path, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+                self.removed += 1
+            except FileNotFoundError:
+                pass
+
+class ResultImageWriter:
+    """
+    结果图片写入器
+
+    编码和写盘在后台线程中进行，检测循环只需把图片放入有界队列；
+    写入跟不上时丢弃新图片而不是占用越来越多的内存。
+    每个输出目录按 OUTPUT_CONFIG['max_files'] / ['max_bytes'] 自动删除最旧的图片。
+    """
+
+    def __init__(self, async_write=None, max_queue=None, max_files=None, max_bytes=None):
+        """
+        Args:
+            async_write: 是否在后台线程写入，默认取 OUTPUT_CONFIG['async_write']
+            max_queue: 等待写入的图片数上限，默认取 OUTPUT_CONFIG['write_queue_size']
+            max_files: 每个输出目录最多保留的图片数，默认取 OUTPUT_CONFIG['max_files']
+            max_bytes: 每个输出目录最多占用的字节数，默认取 OUTPUT_CONFIG['max_bytes']
+        """
+        if async_write is None:
+            async_write = OUTPUT_CONFIG.get('async_write', True)
+        if max_queue is None:
+            max_queue = OUTPUT_CONFIG.get('write_queue_size', 16)
+        self.max_files = max_files if max_files is not None else OUTPUT_CONFIG.get('max_files')
+        self.max_bytes = max_bytes if max_bytes is not None else OUTPUT_CONFIG.get('max_bytes')
+        self.async_write = async_write
+
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+        # 写入指标
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.bytes_written = 0
+
+        self._queue = None
+        self._thread = None
+        if async_write:
+            self._queue = queue.Queue(maxsize=max_queue)
+            self._thread = threading.Thread(target=self._run, name="image-writer", daemon=True)
+            metrics.IMAGE_QUEUE_DEPTH.set_function(self._queue.qsize)
+            self._thread.start()
+
+    def save(self, image, mode, timestamp=None, original_path=None, frame_time=None):
+        """
+        保存结果图片，参数与 process.save_result_image 相同
+
+        Returns:
+            saved_path: 图片的保存路径（后台写入时立即返回，文件稍后写入）；队列已满被丢弃时返回None
+        """
+        output_file = process.result_image_path(mode, timestamp, original_path, frame_time)
+        if not self.async_write:
+            self._write(image, output_file)
+            return output_file
+
+        try:
+            self._queue.put_nowait((image, output_file))
+        except queue.Full:
+            self._count('dropped')
+            metrics.IMAGES.inc(result='dropped')
+            return None
+        return output_file
+
+    def queue_depth(self):
+        """当前等待写入的图片数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        """
+        获取写入指标
+
+        Returns:
+            包含队列深度、写入/丢弃/失败计数、写入字节数和按保留策略删除的文件数的字典
+        """
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'bytes_written': self.bytes_written,
+                'removed': sum(index.removed for index in self._indexes.values())
+            }
+
+    def close(self, timeout=None):
+        """等待队列中剩余图片写入完成，然后停止写入线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _write(self, image, output_file):
+        """编码写入一张图片并执行所在目录的保留策略"""
+        try:
+            size = process.write_result_image(image, output_file)
+        except Exception as e:
+            print(f"保存结果图片失败: {e}")
+            self._count('failed')
+            metrics.IMAGES.inc(result='failed')
+            return
+        metrics.IMAGES.inc(result='written')
+
+        with self._lock:
+            self.written += 1
+            self.bytes_written += size
+            if self.max_files is None and self.max_bytes is None:
+                return
+            output_dir = os.path.dirname(output_file)
+            index = self._indexes.get(output_dir)
+            if index is None:
+                # 新文件已写入，扫描目录时会被包含
+                index = RetentionIndex(output_dir, self.max_files, self.max_bytes)
+                self._indexes[output_dir] = index
+            index.add(output_file, size)
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    break
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+from config import PROCESS_CONFIG
+
+# 影响车位检测结果的配置项，任一项变化时缓存的布局失效
+DETECTION_CONFIG_KEYS = ('analysis_scale', 'roi_polygons', 'row_threshold', 'column_gap_tolerance')
+
+def detection_fingerprint():
+    """根据检测相关配置生成指纹，与缓存布局一起保存"""
+    settings = {key: PROCESS_CONFIG.get(key) for key in DETECTION_CONFIG_KEYS}
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+class SlotLayoutCache:
+    """
+    车位布局缓存
+
+    固定摄像头拍到的车位划线长期不变，因此车位矩形只需检测一次。
+    之后每帧只做一次低分辨率的边缘漂移检查：若当前帧的边缘与缓存车位的
+    轮廓重合度低于阈值（摄像头被移动、换了场景等），才重新检测布局。
+    漂移检查只能发现缓存中的车位消失，发现不了缓存中缺少的车位（例如首次检测时有车挡住了划线），
+    因此每隔recheck_frames帧（以及从磁盘加载后的第一帧）完整重新检测一次，检测到更多车位时替换缓存布局。
+    缓存按停车场层数保存到磁盘，程序启动时自动加载；缓存中同时保存检测配置的指纹，
+    修改缩放比例、检测区域等配置后旧布局视为失效，重新检测。
+    """
+
+    def __init__(self, parking_layer, detector, cache_dir=None, drift_threshold=None, recheck_frames=None):
+        """
+        Args:
+            parking_layer: 停车场层数，作为缓存的键
+            detector: 布局检测函数，签名同 process.detect_parking_slots
+            cache_dir: 缓存目录，默认取 PROCESS_CONFIG['layout_cache_dir']
+            drift_threshold: 轮廓重合度阈值，低于该值时重新检测布局
+            recheck_frames: 定期完整重新检测的间隔帧数，默认取 PROCESS_CONFIG['layout_recheck_frames']，0表示不定期检测
+        """
+        self.parking_layer = parking_layer
+        self.detector = detector
+        if cache_dir is None:
+            cache_dir = PROCESS_CONFIG.get('layout_cache_dir', 'cache')
+        if drift_threshold is None:
+            drift_threshold = PROCESS_CONFIG.get('layout_drift_threshold', 0.6)
+        self.drift_threshold = drift_threshold
+        if recheck_frames is None:
+            recheck_frames = PROCESS_CONFIG.get('layout_recheck_frames', 100)
+        self.recheck_frames = recheck_frames
+        self.cache_file = os.path.join(cache_dir, f'layout_{parking_layer}.npz')
+        self.fingerprint = detection_fingerprint()
+
+        self.slots = None
+        self.rows_count = 0
+        self.columns_count = 0
+        self.frame_shape = None
+        self.layout_fingerprint = None
+        self.rebuild_count = 0
+        self.recheck_count = 0
+        # 距下一次定期检测的帧数，从磁盘加载的布局在第一帧就检测一次
+        self._frames_until_recheck = self.recheck_frames
+
+        # 缓存车位轮廓在缩小尺度下的掩码，随布局一起更新
+        self._outline = None
+
+        self.load()
+
+    def load(self):
+        """从磁盘加载已缓存的布局，文件不存在或已损坏时忽略"""
+        if not os.path.exists(self.cache_file):
+            return False
+        try:
+            with np.load(self.cache_file) as data:
+                slots = [tuple(int(v) for v in slot) for slot in data['slots']]
+                rows_count = int(data['rows_count'])
+                columns_count = int(data['columns_count'])
+                frame_shape = tuple(int(v) for v in data['frame_shape'])
+                # 旧版本的缓存没有指纹，视为与当前配置不一致
+                fingerprint = str(data['fingerprint']) if 'fingerprint' in data.files else None
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self._set_layout(slots, rows_count, columns_count, frame_shape, fingerprint)
+        self._frames_until_recheck = 0
+        return True
+
+    def save(self):
+        """将当前布局写入磁盘（先写临时文件再替换，避免写到一半被读取）"""
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        temp_file = f'{self.cache_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'wb') as f:
+            np.savez(
+                f,
+                slots=np.array(self.slots, dtype=np.int32).reshape(-1, 4),
+                rows_count=self.rows_count,
+                columns_count=self.columns_count,
+                frame_shape=np.array(self.frame_shape, dtype=np.int32),
+                fingerprint=self.layout_fingerprint
+            )
+        os.replace(temp_file, self.cache_file)
+
+    def get_layout(self, frame):
+        """
+        获取当前帧的车位布局，必要时重新检测
+
+        Args:
+            frame: 输入图像
+
+        Returns:
+            slots: 停车位列表，每个元素为(x, y, w, h)
+            rows_count: 停车场行数
+            columns_count: 每行的最大列数
+        """
+        if self.is_stale(frame):
+            self._rebuild(frame, *self.detector(frame))
+        elif self.recheck_frames and self._frames_until_recheck <= 0:
+            # 定期完整检测：检测到的车位比缓存多时说明缓存缺少车位，替换缓存布局；
+            # 车位变少（车辆挡住划线等）时保留缓存，车位真正消失由漂移检查发现
+            slots, rows_count, columns_count = self.detector(frame)
+            self.recheck_count += 1
+            if len(slots) > len(self.slots):
+                self._rebuild(frame, slots, rows_count, columns_count)
+            else:
+                self._frames_until_recheck = self.recheck_frames
+        self._frames_until_recheck -= 1
+
+        return self.slots, self.rows_count, self.columns_count
+
+    def _rebuild(self, frame, slots, rows_count, columns_count):
+        """采用新检测的布局并写入磁盘"""
+        self._set_layout(slots, rows_count, columns_count, frame.shape[:2], self.fingerprint)
+        self.rebuild_count += 1
+        self._frames_until_recheck = self.recheck_frames
+        self.save()
+
+    def is_stale(self, frame):
+        """判断缓存布局是否已不适用于当前帧"""
+        if self.slots is None or not self.slots:
+            return True
+        if self.layout_fingerprint != self.fingerprint:
+            return True
+        if tuple(frame.shape[:2]) != self.frame_shape:
+            return True
+        return self.similarity(frame) < self.drift_threshold
+
+    def similarity(self, frame):
+        """
+        计算当前帧边缘与缓存车位轮廓的重合度
+
+        Returns:
+            缓存轮廓像素中落在当前边缘上的比例 (0~1)
+        """
+        outline = self._outline
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # 整数倍缩小可以走 INTER_AREA 的快速路径
+        small = cv2.resize(gray, (outline.shape[1], outline.shape[0]), interpolation=cv2.INTER_AREA)
+        edges = cv2.Canny(small, 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+
+        matched = cv2.countNonZero(cv2.bitwise_and(outline, edges))
+        return matched / max(1, cv2.countNonZero(outline))
+
+    def _set_layout(self, slots, rows_count, columns_count, frame_shape, fingerprint):
+        """更新布局并重建缩小尺度下的轮廓掩码"""
+        self.slots = list(slots)
+        self.layout_fingerprint = fingerprint
+        self.rows_count = rows_count
+        self.columns_count = columns_count
+        self.frame_shape = tuple(frame_shape)
+
+        height, width = self.frame_shape
+        signature_width = PROCESS_CONFIG.get('layout_signature_width', 480)
+        factor = max(1, width // signature_width)
+        outline = np.zeros((height // factor, width // factor), dtype=np.uint8)
+        for x, y, w, h in self.slots:
+            cv2.rectangle(
+                outline,
+                (x // factor, y // factor),
+                ((x + w) // factor, (y + h) // factor),
+                255, 1
+            )
+
+        self._outline = outline
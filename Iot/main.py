@@ -7,16 +7,33 @@ import argparse
 import time
 from datetime import datetime
 import cv2
-import numpy as np
 
 import process
+import batch
+import multicam
+import metrics
+import status_server
 from upload import ParkingDatabase
+from uploader import AsyncUploader
+from image_writer import ResultImageWriter
 from config import OUTPUT_DIRS, PROCESS_CONFIG
 
 def main():
     """主函数，解析命令行参数并调用相应的处理函数"""
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description="停车场车位识别系统")
+    parser.add_argument("--headless", action="store_true",
+                        help="无界面模式：不打开窗口、不保留处理过的帧，适合没有显示器的边缘设备")
+    parser.add_argument("--save-images", action="store_true",
+                        help="无界面模式下仍然绘制标注并保存结果图片（默认不保存）")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="在该端口提供指标服务（/metrics为Prometheus格式，/stats.json为JSON）")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="指标服务监听地址，默认只监听本机")
+    parser.add_argument("--stats-file", default=None, help="定期把指标快照写入该JSON文件")
+    parser.add_argument("--stats-interval", type=float, default=10, help="写入指标文件的间隔（秒），默认10")
+    parser.add_argument("--status-port", type=int, default=None,
+                        help="在该端口提供车位状态服务（/status支持ETag和长轮询，/events为SSE推送），读取不经过数据库")
+    parser.add_argument("--status-host", default="127.0.0.1", help="车位状态服务监听地址，默认只监听本机")
     
     # 添加子命令
     subparsers = parser.add_subparsers(dest="mode", help="运行模式")
@@ -31,6 +48,23 @@ def main():
     
     # 摄像头模式
     camera_parser = subparsers.add_parser("camera", help="处理摄像头输入")
+    camera_parser.add_argument("--source", default=None, help="摄像头设备编号或视频流地址，默认使用配置")
+    
+    # 多摄像头模式
+    multicam_parser = subparsers.add_parser("multicam", help="单进程同时处理多个摄像头/多个停车场层")
+    multicam_parser.add_argument("--camera", action="append", default=None, metavar="SOURCE:LAYER",
+                                 help="摄像头及其层数，如 0:b1 或 rtsp://host/stream:b2，可重复指定；默认使用配置中的camera_sources")
+    multicam_parser.add_argument("--workers", type=int, default=None, help="共享检测线程数，默认使用配置")
+    
+    # 批量模式
+    batch_parser = subparsers.add_parser("batch", help="多进程批量处理图片和视频")
+    batch_parser.add_argument("inputs", nargs="+", help="目录、文件或通配符（如 'origin/**/*.mp4'）")
+    batch_parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核心数")
+    batch_parser.add_argument("--layer", default=None, help="无法从文件名识别层数(b1-b3)时使用的层数，默认使用配置")
+    
+    # 数据表迁移
+    migrate_parser = subparsers.add_parser("migrate", help="创建/迁移数据表结构")
+    migrate_parser.add_argument("--layers", nargs="+", default=["b1", "b2", "b3"], help="需要迁移的停车场层数，默认b1 b2 b3")
     
     # 解析命令行参数
     args = parser.parse_args()
@@ -39,87 +73,108 @@ def main():
     for dir_path in OUTPUT_DIRS.values():
         os.makedirs(dir_path, exist_ok=True)
     
+    # 有界面时总是保存结果图片；无界面模式只在指定--save-images时绘制标注并保存
+    save_images = not args.headless or args.save_images
+    
+    # 指标服务、指标文件和车位状态服务在所有模式下可用
+    metrics_server = None
+    stats_writer = None
+    status_http = None
+    
     # 根据运行模式调用相应的处理函数
     try:
+        if args.metrics_port is not None:
+            metrics_server = metrics.start_http_server(args.metrics_port, args.metrics_host)
+        if args.stats_file:
+            stats_writer = metrics.StatsFileWriter(args.stats_file, args.stats_interval)
+        if args.status_port is not None:
+            status_http = status_server.start_status_server(args.status_port, args.status_host)
+        
         if args.mode == "image":
             # 先处理图片和上传数据
-            result_data = process_and_upload_image(args.image_path)
+            result_data = process_and_upload_image(args.image_path, save_images)
             # 再显示UI
-            display_image_result(result_data)
+            if not args.headless:
+                display_image_result(result_data)
         elif args.mode == "video":
-            # 先处理视频和上传数据
-            processed_frames = process_and_upload_video(args.video_path)
+            # 先处理视频和上传数据，无界面模式下不保留处理过的帧，内存占用与视频长度无关
+            processed_frames = process_and_upload_video(args.video_path, args.headless, save_images)
             # 再显示UI
-            display_video_results(processed_frames)
+            if not args.headless:
+                display_video_results(processed_frames)
         elif args.mode == "camera":
             # 摄像头模式需要实时处理和显示
-            process_camera_with_display()
+            process_camera_with_display(args.source, args.headless, save_images)
+        elif args.mode == "multicam":
+            process_multicam_with_display(args.camera, args.workers, args.headless, save_images)
+        elif args.mode == "batch":
+            # 批量模式不显示UI
+            process_and_upload_batch(args.inputs, args.workers, args.layer)
+        elif args.mode == "migrate":
+            migrate_tables(args.layers)
         else:
             parser.print_help()
             sys.exit(1)
     except Exception as e:
         print(f"错误: {e}")
         sys.exit(1)
+    finally:
+        if stats_writer is not None:
+            stats_writer.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if status_http is not None:
+            status_http.shutdown()
+
+def migrate_tables(layers):
+    """创建或迁移各层数据表，并记录结构版本"""
+    for parking_layer in layers:
+        with ParkingDatabase(parking_layer) as db:
+            if not db.online:
+                raise RuntimeError("数据库不可用，无法迁移数据表")
+            db.create_tables_if_not_exist()
+    print("数据表迁移完成")
 
-def process_and_upload_image(image_path):
+def process_and_upload_image(image_path, save_images=True):
     """处理图片并上传到数据库，返回显示所需的数据"""
     print(f"处理图片: {image_path}")
     print(f"当前停车场层数: {PROCESS_CONFIG['parking_layer']}")
     print("-"*50)  # 添加分隔线
     
     # 处理图片
-    result_image, free_count, free_slots, total_slots, rows_count, columns_count = process.process_image(image_path)
-    
-    # 创建信息文本
-    info_text = f"File: {os.path.basename(image_path)} | Layer: {PROCESS_CONFIG['parking_layer']} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
-    
-    # 获取原始图像尺寸
-    img_h, img_w = result_image.shape[:2]
-    
-    # 创建一个带有信息栏的扩展图像，底部添加50像素高的信息栏
-    info_bar_height = 50
-    extended_image = np.zeros((img_h + info_bar_height, img_w, 3), dtype=np.uint8)
-    
-    # 填充信息栏部分为深蓝色背景
-    extended_image[img_h:img_h+info_bar_height, 0:img_w] = (100, 50, 0)  # BGR格式，加深颜色
-    
-    # 将原始图像放在信息栏上方
-    extended_image[0:img_h, 0:img_w] = result_image
-    
-    # 在信息栏上添加文本，增加字体大小和粗细
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = 1.2  # 增大字体比例
-    thickness = 3     # 增加字体粗细
-    
-    # 计算文本位置，使其在信息栏中居中
-    text_size = cv2.getTextSize(info_text, font, font_scale, thickness)[0]
-    text_x = (img_w - text_size[0]) // 2  # 水平居中
-    text_y = img_h + (info_bar_height + text_size[1]) // 2  # 垂直居中
-    
-    # 添加文本（带黑色描边使其在任何背景下都清晰可见）
-    # 先绘制黑色描边
-    cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (0, 0, 0), thickness+2)
-    # 再绘制白色文字
-    cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (255, 255, 255), thickness)
-    
-    # 保存结果图片
+    result_image, free_count, free_slots, total_slots, rows_count, columns_count = process.process_image(image_path, annotate=save_images)
     timestamp = datetime.now()
-    saved_path = process.save_result_image(extended_image, 'image', timestamp.strftime("%Y%m%d_%H%M%S"), image_path)
+    
+    extended_image = None
+    saved_path = None
+    if save_images:
+        # 创建信息文本
+        info_text = f"File: {os.path.basename(image_path)} | Layer: {PROCESS_CONFIG['parking_layer']} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
+        
+        # 在图像底部添加信息栏
+        extended_image = process.add_info_bar(result_image, info_text)
+        
+        # 保存结果图片（单张图片直接同步写入，按配置的格式和保留策略）
+        with ResultImageWriter(async_write=False) as writer:
+            saved_path = writer.save(extended_image, 'image', timestamp.strftime("%Y%m%d_%H%M%S"), image_path)
     
     # 计算被占用车位数
     occupied_slots = total_slots - free_count
     
+    record = dict(
+        timestamp=timestamp,
+        total_slots=total_slots,
+        free_slots=free_count,
+        free_positions=free_slots,
+        source_type='image',
+        parking_rows=rows_count,
+        parking_columns=columns_count
+    )
+    status_server.BOARD.publish(PROCESS_CONFIG['parking_layer'], **record)
+    
     # 上传结果到数据库
     with ParkingDatabase() as db:
-        db.upload_result(
-            timestamp=timestamp,
-            total_slots=total_slots,
-            free_slots=free_count,
-            free_positions=free_slots,
-            source_type='image',
-            parking_rows=rows_count,
-            parking_columns=columns_count
-        )
+        db.upload_result(**record)
     
     # 打印结果
     print(f"停车场分析结果:")
@@ -129,7 +184,8 @@ def process_and_upload_image(image_path):
     print(f"空闲车位数: {free_count}")
     print(f"被占用车位数: {occupied_slots}")
     print(f"空闲车位位置: {free_slots}")
-    print(f"结果图片已保存至: {saved_path}")
+    if saved_path:
+        print(f"结果图片已保存至: {saved_path}")
     print("="*50)  # 添加分隔线
     
     # 返回显示所需的数据
@@ -167,63 +223,41 @@ def display_image_result(result_data):
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
-def process_and_upload_video(video_path):
-    """处理视频并上传到数据库，返回所有处理后的帧"""
+def process_and_upload_video(video_path, headless=False, save_images=True):
+    """处理视频并上传到数据库，返回所有处理后的帧（无界面模式下不保留，返回空列表）"""
     print(f"处理视频: {video_path}")
     print(f"当前停车场层数: {PROCESS_CONFIG['parking_layer']}")
     print("-"*50)  # 添加分隔线
     
     # 保存所有处理过的帧，用于后续显示
     processed_frames = []
-    
-    with ParkingDatabase() as db:
-        for timestamp, result_image, free_count, free_slots, frame_time, total_slots, rows_count, columns_count in process.process_video(video_path):
-            # 创建信息文本
-            info_text = f"Frame: {len(processed_frames)+1} | Time: {int(frame_time)}s | Layer: {PROCESS_CONFIG['parking_layer']} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
-            
-            # 获取原始图像尺寸
-            img_h, img_w = result_image.shape[:2]
-            
-            # 创建一个带有信息栏的扩展图像，底部添加50像素高的信息栏
-            info_bar_height = 50
-            extended_image = np.zeros((img_h + info_bar_height, img_w, 3), dtype=np.uint8)
-            
-            # 填充信息栏部分为深蓝色背景
-            extended_image[img_h:img_h+info_bar_height, 0:img_w] = (100, 50, 0)  # BGR格式，加深颜色
-            
-            # 将原始图像放在信息栏上方
-            extended_image[0:img_h, 0:img_w] = result_image
-            
-            # 在信息栏上添加文本，增加字体大小和粗细
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 1.2  # 增大字体比例
-            thickness = 3     # 增加字体粗细
-            
-            # 计算文本位置，使其在信息栏中居中
-            text_size = cv2.getTextSize(info_text, font, font_scale, thickness)[0]
-            text_x = (img_w - text_size[0]) // 2  # 水平居中
-            text_y = img_h + (info_bar_height + text_size[1]) // 2  # 垂直居中
-            
-            # 添加文本（带黑色描边使其在任何背景下都清晰可见）
-            # 先绘制黑色描边
-            cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (0, 0, 0), thickness+2)
-            # 再绘制白色文字
-            cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (255, 255, 255), thickness)
-            
-            # 保存结果图片，传递视频路径和帧时间
-            saved_path = process.save_result_image(
-                extended_image,  # 保存带信息栏的图像
-                'video', 
-                timestamp=datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S"),
-                original_path=video_path,
-                frame_time=frame_time
-            )
+    frame_index = 0
+    
+    # 结果图片和数据库上传都在后台线程中进行；视频不是实时来源，上传队列满时等待而不丢弃结果
+    with AsyncUploader(live=False) as uploader, ResultImageWriter() as writer:
+        for timestamp, result_image, free_count, free_slots, frame_time, total_slots, rows_count, columns_count in process.process_video(video_path, annotate=save_images):
+            frame_index += 1
+            saved_path = None
+            if save_images:
+                # 创建信息文本
+                info_text = f"Frame: {frame_index} | Time: {int(frame_time)}s | Layer: {PROCESS_CONFIG['parking_layer']} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
+                
+                # 在图像底部添加信息栏
+                extended_image = process.add_info_bar(result_image, info_text)
+                
+                # 保存结果图片，传递视频路径和帧时间
+                saved_path = writer.save(
+                    extended_image,  # 保存带信息栏的图像
+                    'video', 
+                    timestamp=datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S"),
+                    original_path=video_path,
+                    frame_time=frame_time
+                )
             
             # 计算被占用车位数
             occupied_slots = total_slots - free_count  # 被占用的车位数
             
-            # 上传结果到数据库
-            db.upload_result(
+            record = dict(
                 timestamp=timestamp,
                 total_slots=total_slots,
                 free_slots=free_count,
@@ -232,6 +266,11 @@ def process_and_upload_video(video_path):
                 parking_rows=rows_count,
                 parking_columns=columns_count
             )
+            # 车位状态变化时推送给状态服务的客户端
+            status_server.BOARD.publish(PROCESS_CONFIG['parking_layer'], **record)
+            
+            # 交给后台线程上传，不阻塞视频处理；汇总按视频内时间计时
+            uploader.submit(frame_time=frame_time, **record)
             
             # 打印结果
             print(f"时间: {datetime.fromtimestamp(timestamp)}")
@@ -242,13 +281,16 @@ def process_and_upload_video(video_path):
             print(f"空闲车位数: {free_count}")
             print(f"被占用车位数: {occupied_slots}")
             print(f"空闲车位位置: {free_slots}")
-            print(f"结果图片已保存至: {saved_path}")
+            if saved_path:
+                print(f"结果图片已保存至: {saved_path}")
+            print(f"上传队列深度: {uploader.queue_depth()}")
             print("="*50)  # 添加分隔线
             
             # 保存当前帧和信息，以便后续显示
-            processed_frames.append((extended_image, frame_time, free_count, free_slots, total_slots, occupied_slots, rows_count, columns_count))
+            if not headless:
+                processed_frames.append((extended_image, frame_time, free_count, free_slots, total_slots, occupied_slots, rows_count, columns_count))
     
-    # 数据库连接已关闭，返回处理后的帧
+    # 剩余结果已上传完成，返回处理后的帧
     return processed_frames
 
 def display_video_results(processed_frames):
@@ -323,68 +365,99 @@ def display_video_results(processed_frames):
     cv2.destroyAllWindows()
     print("视频浏览结束")
 
-def process_camera_with_display():
-    """处理摄像头输入，结合数据处理和UI显示"""
+def process_and_upload_batch(inputs, workers=None, default_layer=None):
+    """多进程批量处理图片和视频，并按层上传到数据库"""
+    sources = batch.collect_sources(inputs)
+    if not sources:
+        print("没有找到需要处理的图片或视频")
+        return
+    
+    print(f"批量处理 {len(sources)} 个文件，工作进程数: {workers or os.cpu_count()}")
+    print("-"*50)  # 添加分隔线
+    
+    # 每层共用一个数据库连接，批量写入以减少事务数量
+    databases = {}
+    failed_sources = []
+    uploaded_count = 0
+    start_time = time.time()
+    
+    try:
+        for path, parking_layer, source_type, records, error in batch.run_batch(sources, workers, default_layer):
+            if error is not None:
+                print(f"处理失败: {path}: {error}")
+                failed_sources.append(path)
+                continue
+            
+            if parking_layer not in databases:
+                databases[parking_layer] = ParkingDatabase(parking_layer, buffered=True)
+            db = databases[parking_layer]
+            
+            # 同一文件的结果按时间顺序上传
+            for record in records:
+                db.upload_result(
+                    timestamp=record['timestamp'],
+                    total_slots=record['total_slots'],
+                    free_slots=record['free_count'],
+                    free_positions=record['free_slots'],
+                    source_type=source_type,
+                    parking_rows=record['rows_count'],
+                    parking_columns=record['columns_count'],
+                    frame_time=record['frame_time']
+                )
+                uploaded_count += 1
+            
+            print(f"已完成: {path} | 层数: {parking_layer} | 分析帧数: {len(records)}")
+    finally:
+        for db in databases.values():
+            db.close()
+    
+    print("="*50)  # 添加分隔线
+    print(f"批量处理完成: {len(sources) - len(failed_sources)}/{len(sources)} 个文件，上传 {uploaded_count} 条记录，耗时 {time.time() - start_time:.1f}秒")
+    if failed_sources:
+        print(f"处理失败的文件: {failed_sources}")
+
+def process_camera_with_display(source=None, headless=False, save_images=True):
+    """处理摄像头输入，结合数据处理和UI显示（无界面模式下只处理和上传）"""
     print("启动摄像头模式...")
     print(f"当前停车场层数: {PROCESS_CONFIG['parking_layer']}")
     print("-"*50)  # 添加分隔线
     
     # 创建一个窗口
-    cv2.namedWindow("停车场分析结果", cv2.WINDOW_NORMAL)
+    if not headless:
+        cv2.namedWindow("停车场分析结果", cv2.WINDOW_NORMAL)
     
     # 帧计数器
     frame_count = 0
     
     try:
-        # 摄像头模式需要实时处理，所以数据库连接需要在整个过程中保持
-        with ParkingDatabase() as db:
-            for timestamp, result_image, free_count, free_slots, total_slots, rows_count, columns_count in process.process_camera():
+        # 摄像头模式需要实时处理，数据库连接由后台上传线程在整个过程中保持
+        with AsyncUploader() as uploader, ResultImageWriter() as writer:
+            for timestamp, result_image, free_count, free_slots, total_slots, rows_count, columns_count in process.process_camera(source, annotate=save_images):
                 frame_count += 1
                 
-                # 创建信息文本
-                info_text = f"Camera Frame: {frame_count} | Time: {datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')} | Layer: {PROCESS_CONFIG['parking_layer']} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
-                
-                # 获取原始图像尺寸
-                img_h, img_w = result_image.shape[:2]
-                
-                # 创建一个带有信息栏的扩展图像，底部添加50像素高的信息栏
-                info_bar_height = 50
-                extended_image = np.zeros((img_h + info_bar_height, img_w, 3), dtype=np.uint8)
-                
-                # 填充信息栏部分为深蓝色背景
-                extended_image[img_h:img_h+info_bar_height, 0:img_w] = (100, 50, 0)  # BGR格式，加深颜色
-                
-                # 将原始图像放在信息栏上方
-                extended_image[0:img_h, 0:img_w] = result_image
+                # 从画面采集到得到分析结果的延迟
+                latency = time.time() - timestamp
+                metrics.CAPTURE_LATENCY_SECONDS.observe(latency)
                 
-                # 在信息栏上添加文本，增加字体大小和粗细
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 1.2  # 增大字体比例
-                thickness = 3     # 增加字体粗细
-                
-                # 计算文本位置，使其在信息栏中居中
-                text_size = cv2.getTextSize(info_text, font, font_scale, thickness)[0]
-                text_x = (img_w - text_size[0]) // 2  # 水平居中
-                text_y = img_h + (info_bar_height + text_size[1]) // 2  # 垂直居中
-                
-                # 添加文本（带黑色描边使其在任何背景下都清晰可见）
-                # 先绘制黑色描边
-                cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (0, 0, 0), thickness+2)
-                # 再绘制白色文字
-                cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (255, 255, 255), thickness)
-                
-                # 保存结果图片
-                saved_path = process.save_result_image(
-                    extended_image, 
-                    'camera', 
-                    datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
-                )
+                saved_path = None
+                if save_images:
+                    # 创建信息文本
+                    info_text = f"Camera Frame: {frame_count} | Time: {datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')} | Layer: {PROCESS_CONFIG['parking_layer']} | Free: {free_count} | Grid: {rows_count}x{columns_count}"
+                    
+                    # 在图像底部添加信息栏
+                    extended_image = process.add_info_bar(result_image, info_text)
+                    
+                    # 保存结果图片
+                    saved_path = writer.save(
+                        extended_image, 
+                        'camera', 
+                        datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
+                    )
                 
                 # 计算被占用车位数
                 occupied_slots = total_slots - free_count  # 被占用的车位数
                 
-                # 上传结果到数据库
-                db.upload_result(
+                record = dict(
                     timestamp=timestamp,
                     total_slots=total_slots,
                     free_slots=free_count,
@@ -393,6 +466,11 @@ def process_camera_with_display():
                     parking_rows=rows_count,
                     parking_columns=columns_count
                 )
+                # 车位状态变化时推送给状态服务的客户端
+                status_server.BOARD.publish(PROCESS_CONFIG['parking_layer'], **record)
+                
+                # 交给后台线程上传，数据库变慢时不阻塞摄像头采集
+                uploader.submit(**record)
                 
                 # 打印结果
                 print(f"时间: {datetime.fromtimestamp(timestamp)}")
@@ -402,9 +480,15 @@ def process_camera_with_display():
                 print(f"空闲车位数: {free_count}")
                 print(f"被占用车位数: {occupied_slots}")
                 print(f"空闲车位位置: {free_slots}")
-                print(f"结果图片已保存至: {saved_path}")
+                if saved_path:
+                    print(f"结果图片已保存至: {saved_path}")
+                print(f"采集到结果延迟: {latency:.3f}秒")
+                print(f"上传队列深度: {uploader.queue_depth()}")
                 print("="*50)  # 添加分隔线
                 
+                if headless:
+                    continue
+                
                 # 调整图像大小以适应屏幕
                 h, w = extended_image.shape[:2]
                 max_height = 800  # 最大显示高度
@@ -426,8 +510,91 @@ def process_camera_with_display():
     except KeyboardInterrupt:
         print("用户中断，停止摄像头模式")
     finally:
-        cv2.destroyAllWindows()
+        if not headless:
+            cv2.destroyAllWindows()
         print("摄像头模式已结束")
 
+def process_multicam_with_display(cameras=None, workers=None, headless=False, save_images=True):
+    """同时处理多个摄像头，检测线程池、数据库连接池和上传线程由所有摄像头共用"""
+    sources = multicam.parse_camera_sources(cameras or PROCESS_CONFIG.get('camera_sources', []))
+    
+    print(f"启动多摄像头模式，共 {len(sources)} 路:")
+    for source, parking_layer, name in sources:
+        print(f"  {name}: {source} -> 层数 {parking_layer}")
+    print("-"*50)  # 添加分隔线
+    
+    frame_counts = {}
+    
+    try:
+        with AsyncUploader() as uploader, ResultImageWriter() as writer, multicam.MultiCameraRunner(sources, workers, annotate=save_images) as runner:
+            # 每秒返回一次，即使没有新结果也能响应窗口按键
+            for result in runner.iter_results(timeout=1):
+                if result is not None:
+                    name = result['camera']
+                    parking_layer = result['parking_layer']
+                    timestamp = result['timestamp']
+                    free_count = result['free_count']
+                    total_slots = result['total_slots']
+                    frame_counts[name] = frame_counts.get(name, 0) + 1
+                    latency = time.time() - timestamp
+                    metrics.CAPTURE_LATENCY_SECONDS.observe(latency, camera=name)
+                    
+                    saved_path = None
+                    if save_images:
+                        # 创建信息文本并添加信息栏
+                        info_text = f"Camera: {name} | Frame: {frame_counts[name]} | Time: {datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')} | Layer: {parking_layer} | Free: {free_count} | Grid: {result['rows_count']}x{result['columns_count']}"
+                        extended_image = process.add_info_bar(result['result_image'], info_text)
+                        
+                        # 文件名中带摄像头名称，避免同一秒的结果互相覆盖
+                        saved_path = writer.save(
+                            extended_image,
+                            'camera',
+                            f"{name}_{datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S')}"
+                        )
+                    
+                    record = dict(
+                        timestamp=timestamp,
+                        total_slots=total_slots,
+                        free_slots=free_count,
+                        free_positions=result['free_slots'],
+                        source_type='camera',
+                        parking_rows=result['rows_count'],
+                        parking_columns=result['columns_count']
+                    )
+                    # 车位状态变化时推送给状态服务的客户端
+                    status_server.BOARD.publish(parking_layer, **record)
+                    
+                    # 按层上传到对应的数据表
+                    uploader.submit(parking_layer=parking_layer, **record)
+                    
+                    print(f"[{name}] 时间: {datetime.fromtimestamp(timestamp)} | 层数: {parking_layer} | 空闲: {free_count}/{total_slots} | 空闲车位位置: {result['free_slots']}")
+                    if saved_path:
+                        print(f"[{name}] 结果图片已保存至: {saved_path}")
+                    print(f"[{name}] 采集到结果延迟: {latency:.3f}秒 | 上传队列深度: {uploader.queue_depth()}")
+                    print("="*50)  # 添加分隔线
+                    
+                    # 每个摄像头一个窗口
+                    if not headless:
+                        h, w = extended_image.shape[:2]
+                        scale = min(1.0, 800 / h, 1200 / w)
+                        display_image = cv2.resize(extended_image, (int(w * scale), int(h * scale))) if scale < 1.0 else extended_image
+                        window_name = f"停车场分析结果 - {name}"
+                        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+                        cv2.imshow(window_name, display_image)
+                
+                if not headless:
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
+                        break
+            
+            print(f"采集统计: {runner.stats()}")
+    
+    except KeyboardInterrupt:
+        print("用户中断，停止多摄像头模式")
+    finally:
+        if not headless:
+            cv2.destroyAllWindows()
+        print("多摄像头模式已结束")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 阶段耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def _snapshot_key(key):
+    """JSON快照中的标签键，例如 'stage=detect'，没有标签时为 'value'"""
+    return ','.join(f'{name}={value}' for name, value in key) or 'value'
+
+def _format_labels(key):
+    """Prometheus文本格式中的标签，例如 '{stage="detect"}'"""
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in key) + '}'
+
+class Counter:
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {_snapshot_key(key): value for key, value in self._values.items()}
+
+class Gauge:
+    """可增可减的当前值，也可以绑定一个读取函数，在导出时取值"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function, **labels):
+        """导出时调用function()获取当前值（例如队列深度）"""
+        with self._lock:
+            self._functions[_label_key(labels)] = function
+
+    def _current(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                # 被观察的对象已关闭时不影响其他指标的导出
+                pass
+        return values
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self._current().items()]
+
+    def snapshot(self):
+        return {_snapshot_key(key): value for key, value in self._current().items()}
+
+class Histogram:
+    """按固定桶统计的耗时分布"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """统计with代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    result.append((f'{self.name}_bucket', key + (('le', repr(bound)),), cumulative))
+                result.append((f'{self.name}_bucket', key + (('le', '+Inf'),), series['count']))
+                result.append((f'{self.name}_sum', key, series['sum']))
+                result.append((f'{self.name}_count', key, series['count']))
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                _snapshot_key(key): {
+                    'count': series['count'],
+                    'sum': round(series['sum'], 6),
+                    'mean': round(series['sum'] / series['count'], 6) if series['count'] else None,
+                    'buckets': dict(zip((repr(bound) for bound in self.buckets), series['counts']))
+                }
+                for key, series in self._series.items()
+            }
+
+class Registry:
+    """进程内的指标集合"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name, documentation):
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def render_prometheus(self):
+        """生成Prometheus文本格式的指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for name, key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """生成可JSON序列化的指标快照"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            'timestamp': time.time(),
+            'metrics': {metric.name: metric.snapshot() for metric in metrics}
+        }
+
+REGISTRY = Registry()
+
+# 检测流程各阶段耗时：decode、motion、detect、classify、annotate、save、upload
+STAGE_SECONDS = REGISTRY.histogram('parking_stage_duration_seconds', '检测流程各阶段耗时（秒）')
+# 摄像头画面从采集到得到分析结果的延迟
+CAPTURE_LATENCY_SECONDS = REGISTRY.histogram('parking_capture_to_result_seconds', '画面采集到得到分析结果的延迟（秒）')
+FRAMES_PROCESSED = REGISTRY.counter('parking_frames_processed_total', '已分析的帧数')
+FRAMES_DROPPED = REGISTRY.counter('parking_frames_dropped_total', '未分析而被丢弃的帧数（reason: stale为被更新画面覆盖，busy为检测繁忙时跳过，no_motion为画面无变化时跳过）')
+FRAMES_FAILED = REGISTRY.counter('parking_frames_failed_total', '分析失败的帧数')
+UPLOADS = REGISTRY.counter('parking_uploads_total', '上传结果数（result: ok/failed/dropped）')
+IMAGES = REGISTRY.counter('parking_result_images_total', '结果图片数（result: written/failed/dropped）')
+UPLOAD_QUEUE_DEPTH = REGISTRY.gauge('parking_upload_queue_depth', '等待上传的结果数')
+IMAGE_QUEUE_DEPTH = REGISTRY.gauge('parking_image_queue_depth', '等待写入的结果图片数')
+SAMPLING_INTERVAL_SECONDS = REGISTRY.gauge('parking_sampling_interval_seconds', '运动检测自适应的当前分析间隔（秒）')
+
+def stage_timer(stage):
+    """统计检测流程中某个阶段的耗时，用法: with metrics.stage_timer('detect'): ..."""
+    return STAGE_SECONDS.time(stage=stage)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] in ('/', '/metrics'):
+            body = self.registry.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/stats.json':
+            body = json.dumps(self.registry.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不打印访问日志
+        pass
+
+def start_http_server(port, host='127.0.0.1'):
+    """
+    在后台线程中启动指标HTTP服务
+
+    /metrics 为Prometheus文本格式，/stats.json 为JSON快照
+
+    Args:
+        port: 监听端口
+        host: 监听地址，默认只监听本机
+
+    Returns:
+        server: ThreadingHTTPServer实例，调用shutdown()停止
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    print(f"指标服务已启动: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+class StatsFileWriter:
+    """按固定间隔把指标快照写入JSON文件（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+
+    def __init__(self, path, interval=10, registry=REGISTRY):
+        """
+        Args:
+            path: JSON文件路径
+            interval: 写入间隔（秒）
+            registry: 指标集合
+        """
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-stats-file", daemon=True)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._thread.start()
+
+    def write(self):
+        temp_file = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.path)
+
+    def close(self):
+        """停止定时写入，并写入最后一次快照"""
+        self._stop_event.set()
+        self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"写入指标文件失败: {e}")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+import metrics
+from config import PROCESS_CONFIG
+
+class MotionGate:
+    """
+    运动检测门控和自适应采样间隔
+
+    完整的车位检测开销较大，而夜间等时段画面长时间不变。门控把画面缩小并转为灰度后，
+    与上一次完整分析时的画面做帧差，变化像素比例低于阈值时跳过本次分析：
+        有运动：立即分析，间隔缩短到min_interval，高峰期更快反映车位变化
+        无运动：跳过分析，间隔按backoff倍数逐步延长，最长为max_interval
+        距上次分析达到max_interval时无论是否有运动都分析一次，光线缓慢变化等也能被更新
+    参考画面只在完整分析时更新，车辆缓慢驶入等逐渐累积的变化同样会触发分析。
+    """
+
+    def __init__(self, name='default', min_interval=None, max_interval=None, threshold=None,
+                 pixel_threshold=None, scale=None, backoff=None):
+        """
+        Args:
+            name: 指标中区分摄像头/视频的名称
+            min_interval: 最短分析间隔（秒），默认取 PROCESS_CONFIG['sampling_min_interval']
+            max_interval: 最长分析间隔（秒），默认取 PROCESS_CONFIG['sampling_max_interval']
+            threshold: 判定为有运动的变化像素比例，默认取 PROCESS_CONFIG['motion_threshold']
+            pixel_threshold: 灰度差超过该值的像素视为变化，默认取 PROCESS_CONFIG['motion_pixel_threshold']
+            scale: 帧差前的缩放比例，默认取 PROCESS_CONFIG['motion_scale']
+            backoff: 无运动时分析间隔的增长倍数，默认取 PROCESS_CONFIG['sampling_backoff']
+        """
+        self.name = name
+        self.min_interval = min_interval if min_interval is not None else PROCESS_CONFIG.get('sampling_min_interval', 2)
+        self.max_interval = max_interval if max_interval is not None else PROCESS_CONFIG.get('sampling_max_interval', 30)
+        if not 0 < self.min_interval <= self.max_interval:
+            raise ValueError(f"分析间隔范围无效: {self.min_interval}-{self.max_interval}")
+        self.threshold = threshold if threshold is not None else PROCESS_CONFIG.get('motion_threshold', 0.01)
+        self.pixel_threshold = pixel_threshold if pixel_threshold is not None else PROCESS_CONFIG.get('motion_pixel_threshold', 25)
+        self.scale = scale if scale is not None else PROCESS_CONFIG.get('motion_scale', 0.125)
+        if not 0 < self.scale <= 1:
+            raise ValueError(f"帧差缩放比例应在0到1之间: {self.scale}")
+        self.backoff = backoff if backoff is not None else PROCESS_CONFIG.get('sampling_backoff', 1.5)
+        if self.backoff < 1:
+            raise ValueError(f"间隔增长倍数不能小于1: {self.backoff}")
+
+        self.interval = self.min_interval
+        self._reference = None
+        self._last_analysis_time = None
+
+        # 门控指标
+        self.checked = 0
+        self.analyzed = 0
+        self.skipped = 0
+        self.last_motion = None
+
+        metrics.SAMPLING_INTERVAL_SECONDS.set(self.interval, source=self.name)
+
+    def check(self, frame, timestamp):
+        """
+        判断当前帧是否需要完整分析，并调整下一次检查的间隔（self.interval）
+
+        Args:
+            frame: 当前帧（BGR）
+            timestamp: 当前帧的时间（秒），视频模式为视频内时间
+
+        Returns:
+            analyze: 是否需要完整分析
+        """
+        self.checked += 1
+        with metrics.stage_timer('motion'):
+            small = self._prepare(frame)
+
+            if self._reference is None or self._reference.shape != small.shape:
+                analyze = True
+                self.last_motion = None
+            else:
+                diff = cv2.absdiff(small, self._reference)
+                self.last_motion = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+                analyze = bool(self.last_motion >= self.threshold)
+
+        if analyze:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+            # 长时间没有分析时强制分析一次
+            if timestamp - self._last_analysis_time >= self.max_interval:
+                analyze = True
+
+        if analyze:
+            self.analyzed += 1
+            self._reference = small
+            self._last_analysis_time = timestamp
+        else:
+            self.skipped += 1
+            metrics.FRAMES_DROPPED.inc(reason='no_motion')
+        metrics.SAMPLING_INTERVAL_SECONDS.set(self.interval, source=self.name)
+        return analyze
+
+    def stats(self):
+        """门控指标：检查次数、分析次数、跳过次数和当前间隔"""
+        return {
+            'checked': self.checked,
+            'analyzed': self.analyzed,
+            'skipped': self.skipped,
+            'interval': self.interval
+        }
+
+    def _prepare(self, frame):
+        """缩小、转灰度并模糊，减少噪点和压缩伪影造成的误判"""
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+def create_motion_gate(name='default'):
+    """根据配置创建运动检测门控，PROCESS_CONFIG['motion_gate']未启用时返回None"""
+    if not PROCESS_CONFIG.get('motion_gate'):
+        return None
+    return MotionGate(name)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import process
+import metrics
+from slot_tracker import create_slot_tracker
+from motion_gate import create_motion_gate
+from config import PROCESS_CONFIG
+
+# 通知结果消费者所有摄像头均已停止的哨兵
+_DONE = object()
+
+def parse_camera_sources(entries):
+    """
+    解析多摄像头配置
+
+    每层只能对应一个摄像头：上传、增量比较、占用率汇总和最新状态快照都按层保存，
+    同一层的多个摄像头会互相覆盖对方的结果，因此重复的层数直接报错。
+
+    Args:
+        entries: 列表，元素为 {'source': 0, 'layer': 'b1'} 形式的字典，
+                 或命令行中的 "源:层数" 字符串（如 "0:b1"、"rtsp://host/stream:b2"）
+
+    Returns:
+        sources: [(source, parking_layer, name), ...]，name默认为层数
+    """
+    sources = []
+    seen = {}
+    for entry in entries:
+        if isinstance(entry, str):
+            # 流地址中可能含有冒号，只按最后一个冒号拆分
+            source, sep, parking_layer = entry.rpartition(':')
+            if not sep or not source or not parking_layer:
+                raise ValueError(f"摄像头参数格式应为 源:层数，实际为: {entry}")
+            name = None
+        else:
+            source = entry['source']
+            parking_layer = entry['layer']
+            name = entry.get('name')
+        parking_layer = parking_layer.lower()
+        if parking_layer in seen:
+            raise ValueError(f"层数 {parking_layer} 对应了多个摄像头（{seen[parking_layer]} 和 {source}），每层只能配置一个摄像头")
+        seen[parking_layer] = source
+        sources.append((source, parking_layer, name or parking_layer))
+    return sources
+
+class CameraWorker(threading.Thread):
+    """
+    单个摄像头的采集线程
+
+    线程持续读取画面，每隔camera_interval秒（启用运动检测门控时为自适应间隔）把当前帧交给共享的检测线程池。
+    上一帧尚未检测完时跳过本次提交，慢速摄像头或检测积压不会占满线程池。
+    """
+
+    def __init__(self, source, parking_layer, name, executor, results, annotate=True):
+        """
+        Args:
+            source: 摄像头设备编号或视频流地址
+            parking_layer: 停车场层数
+            name: 摄像头名称，作为布局缓存的键
+            executor: 共享的检测线程池
+            results: 检测结果队列
+            annotate: 是否绘制车位标注
+        """
+        super().__init__(name=f"camera-{name}", daemon=True)
+        self.source = source
+        self.parking_layer = parking_layer
+        self.camera_name = name
+        self.executor = executor
+        self.results = results
+        self.annotate = annotate
+        self.interval = PROCESS_CONFIG.get('camera_interval', 10)
+        self.reopen_delay = PROCESS_CONFIG.get('camera_reopen_delay', 5)
+        self.layout_cache = process.create_layout_cache(name)
+        self.tracker = create_slot_tracker()
+        self.gate = create_motion_gate(name)
+
+        self._stop_event = threading.Event()
+        self._pending = None
+
+        # 采集指标
+        self.frames_read = 0
+        self.frames_submitted = 0
+        self.frames_gated = 0
+        self.frames_skipped = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        """采集主循环，画面读取失败时按reopen_delay间隔重新打开"""
+        last_process_time = 0
+        while not self._stop_event.is_set():
+            try:
+                cap = process.open_camera(self.source)
+            except ValueError as e:
+                print(f"[{self.camera_name}] {e}，{self.reopen_delay}秒后重试")
+                self._stop_event.wait(self.reopen_delay)
+                continue
+
+            try:
+                while not self._stop_event.is_set():
+                    with metrics.stage_timer('decode'):
+                        ret, frame = cap.read()
+                    if not ret:
+                        print(f"[{self.camera_name}] 读取画面失败，重新打开摄像头")
+                        break
+                    self.frames_read += 1
+
+                    current_time = time.time()
+                    interval = self.gate.interval if self.gate is not None else self.interval
+                    if current_time - last_process_time < interval:
+                        continue
+
+                    # 上一帧仍在检测时跳过，保证每个摄像头最多只占用一个检测线程
+                    if self._pending is not None and not self._pending.done():
+                        self.frames_skipped += 1
+                        metrics.FRAMES_DROPPED.inc(reason='busy')
+                        continue
+
+                    last_process_time = current_time
+                    
+                    # 运动检测门控：画面无变化时跳过，不占用检测线程
+                    if self.gate is not None and not self.gate.check(frame, current_time):
+                        self.frames_gated += 1
+                        continue
+                    
+                    self.frames_submitted += 1
+                    self._pending = self.executor.submit(self._detect, frame, current_time)
+            finally:
+                cap.release()
+
+            self._stop_event.wait(self.reopen_delay)
+
+    def _detect(self, frame, timestamp):
+        """在检测线程池中处理一帧，结果放入结果队列"""
+        try:
+            result_image, free_count, free_slots, total_slots, rows_count, columns_count = process.process_frame(frame, self.layout_cache, self.annotate, self.tracker)
+        except Exception as e:
+            # 失败次数已在process_frame中计数
+            print(f"[{self.camera_name}] 处理画面失败: {e}")
+            return
+        self.results.put({
+            'camera': self.camera_name,
+            'parking_layer': self.parking_layer,
+            'timestamp': timestamp,
+            'result_image': result_image,
+            'free_count': free_count,
+            'free_slots': free_slots,
+            'total_slots': total_slots,
+            'rows_count': rows_count,
+            'columns_count': columns_count
+        })
+
+class MultiCameraRunner:
+    """
+    多摄像头并发采集
+
+    每个摄像头一个采集线程，所有摄像头共用一个检测线程池（OpenCV在计算时释放GIL，线程可以并行），
+    检测结果汇总到同一个队列，由调用方统一保存和上传。
+    """
+
+    def __init__(self, sources, workers=None, annotate=True):
+        """
+        Args:
+            sources: parse_camera_sources 的返回值
+            workers: 检测线程数，默认取 PROCESS_CONFIG['detection_workers']，未配置时为摄像头数与CPU核心数中的较小值
+            annotate: 是否绘制车位标注，结果中的result_image在关闭时为None
+        """
+        if not sources:
+            raise ValueError("没有配置摄像头")
+        if workers is None:
+            workers = PROCESS_CONFIG.get('detection_workers') or min(len(sources), os.cpu_count() or 1)
+
+        self.results = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detector")
+        self.workers = [
+            CameraWorker(source, parking_layer, name, self.executor, self.results, annotate)
+            for source, parking_layer, name in sources
+        ]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        """停止所有采集线程，等待正在进行的检测完成"""
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join()
+        self.executor.shutdown(wait=True)
+        self.results.put(_DONE)
+
+    def iter_results(self, timeout=None):
+        """
+        按完成顺序获取检测结果
+
+        Args:
+            timeout: 等待单条结果的最长秒数，超时时产出None，便于调用方处理界面事件
+
+        Yields:
+            result: 包含camera、parking_layer、timestamp及检测结果的字典
+        """
+        while True:
+            try:
+                result = self.results.get(timeout=timeout)
+            except queue.Empty:
+                yield None
+                continue
+            if result is _DONE:
+                break
+            yield result
+
+    def stats(self):
+        """
+        获取各摄像头的采集指标
+
+        Returns:
+            {摄像头名称: {'frames_read', 'frames_submitted', 'frames_gated', 'frames_skipped'}}，
+            frames_gated为运动检测判定画面无变化而跳过的帧数
+        """
+        return {
+            worker.camera_name: {
+                'frames_read': worker.frames_read,
+                'frames_submitted': worker.frames_submitted,
+                'frames_gated': worker.frames_gated,
+                'frames_skipped': worker.frames_skipped
+            }
+            for worker in self.workers
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -6,30 +6,116 @@ import numpy as np
 import os
 import time
 from datetime import datetime
-from config import OUTPUT_DIRS
+from config import OUTPUT_DIRS, PROCESS_CONFIG
+try:
+    from config import OUTPUT_CONFIG
+except ImportError:
+    # 兼容未添加输出配置的旧配置文件
+    OUTPUT_CONFIG = {}
+from layout_cache import SlotLayoutCache
+from frame_grabber import LatestFrameGrabber
+from slot_tracker import create_slot_tracker
+from motion_gate import create_motion_gate
+import metrics
 
 # 确保输出目录存在
 for dir_path in OUTPUT_DIRS.values():
     os.makedirs(dir_path, exist_ok=True)
 
-def detect_parking_slots(image):
+# 绿色范围
+LOWER_GREEN = np.array([40, 50, 50])
+UPPER_GREEN = np.array([80, 255, 255])
+
+# 红色范围 (注意红色在HSV中有两个范围)
+LOWER_RED1 = np.array([0, 50, 50])
+UPPER_RED1 = np.array([10, 255, 255])
+LOWER_RED2 = np.array([170, 50, 50])
+UPPER_RED2 = np.array([180, 255, 255])
+
+# 批量统计使用的等价形式：三个范围共用的饱和度/亮度范围，以及色调到颜色类别的查找表（绿色1，红色2）
+LOWER_SATURATION_VALUE = np.array([0, LOWER_GREEN[1], LOWER_GREEN[2]])
+UPPER_SATURATION_VALUE = np.array([255, UPPER_GREEN[1], UPPER_GREEN[2]])
+HUE_CLASSES = np.zeros(256, dtype=np.uint8)
+HUE_CLASSES[LOWER_GREEN[0]:UPPER_GREEN[0] + 1] = 1
+HUE_CLASSES[LOWER_RED1[0]:UPPER_RED1[0] + 1] = 2
+HUE_CLASSES[LOWER_RED2[0]:UPPER_RED2[0] + 1] = 2
+
+def analysis_scale(scale=None):
+    """
+    获取检测时的缩放比例
+    
+    Args:
+        scale: 指定的缩放比例，为None时取 PROCESS_CONFIG['analysis_scale']
+    
+    Returns:
+        scale: 0~1之间的缩放比例，1表示按原分辨率检测
+    """
+    if scale is None:
+        scale = PROCESS_CONFIG.get('analysis_scale', 1.0)
+    return min(1.0, scale) if scale and scale > 0 else 1.0
+
+def downscale(image, scale):
+    """
+    按比例缩小图像（INTER_AREA），比例为1时原样返回
+    
+    以fx/fy而不是目标尺寸指定比例，1/2、1/4等整数分之一的比例可以走 INTER_AREA 的快速路径。
+    """
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def roi_mask(shape, polygons):
+    """
+    根据检测区域生成掩码
+    
+    Args:
+        shape: 掩码的(高, 宽)
+        polygons: 多边形列表，顶点坐标为相对于画面宽高的比例 (0~1)
+    
+    Returns:
+        mask: 区域内为255的单通道掩码
+    """
+    height, width = shape[:2]
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for polygon in polygons:
+        points = np.array([(x * width, y * height) for x, y in polygon], dtype=np.float64)
+        cv2.fillPoly(mask, [np.round(points).astype(np.int32)], 255)
+    return mask
+
+def detect_parking_slots(image, scale=None, roi=None):
     """
     检测图像中的停车位
     
+    高分辨率画面可以先缩小再检测（PROCESS_CONFIG['analysis_scale']），检测到的矩形会换算回原图坐标；
+    PROCESS_CONFIG['roi_polygons']指定的区域之外（天花板、车道等）不参与检测。
+    
     Args:
         image: 输入图像
+        scale: 检测时的缩放比例，默认取 PROCESS_CONFIG['analysis_scale']
+        roi: 检测区域多边形列表，默认取 PROCESS_CONFIG['roi_polygons']
     
     Returns:
-        sorted_slots: 检测到的停车位列表，每个元素为(x, y, w, h)
+        sorted_slots: 检测到的停车位列表，每个元素为原图坐标下的(x, y, w, h)
         rows_count: 停车场行数
         columns_count: 每行的最大列数
     """
-    # 转换为灰度图
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = analysis_scale(scale)
+    if roi is None:
+        roi = PROCESS_CONFIG.get('roi_polygons')
+    
+    # 转换为灰度图，按检测比例缩小
+    gray = downscale(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), scale)
     
     # 边缘检测
     edges = cv2.Canny(gray, 50, 150)
     
+    # 在边缘图上应用检测区域（直接遮挡原图会在区域边界上产生额外的边缘）
+    if roi:
+        edges = cv2.bitwise_and(edges, roi_mask(edges.shape, roi))
+    
+    # 面积阈值随缩放比例换算
+    min_area = 1000 * scale * scale
+    
     # 查找轮廓
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
@@ -40,52 +126,99 @@ def detect_parking_slots(image):
         area = cv2.contourArea(contour)
         
         # 过滤掉太小的区域
-        if area < 1000:
+        if area < min_area:
             continue
         
         # 获取最小外接矩形
         x, y, w, h = cv2.boundingRect(contour)
         
+        # 换算回原图坐标
+        if scale < 1.0:
+            x, y = int(round(x / scale)), int(round(y / scale))
+            w, h = int(round(w / scale)), int(round(h / scale))
+        
         # 保存停车位信息 (x, y, w, h)
         slots.append((x, y, w, h))
     
     # 对停车位进行排序：先按y坐标（行）排序，y相近的按x坐标（列）排序
-    # 定义行分组的阈值（同一行的y坐标差异不超过这个值）
-    row_threshold = 30
-    
-    # 按y坐标对车位进行粗略分组
-    slots_by_row = {}
-    for slot in slots:
-        x, y, w, h = slot
-        # 查找最近的行
-        found_row = False
-        for row_y in slots_by_row.keys():
-            if abs(y - row_y) < row_threshold:
-                slots_by_row[row_y].append(slot)
-                found_row = True
-                break
-        
-        # 如果没有找到合适的行，创建新行
-        if not found_row:
-            slots_by_row[y] = [slot]
+    rows = group_slots_into_rows(slots, PROCESS_CONFIG.get('row_threshold', 30))
     
-    # 对每一行内的车位按x坐标排序，并将所有车位重新组织成有序列表
-    sorted_slots = []
+    # 将所有车位按行重新组织成有序列表
+    sorted_slots = [slot for row in rows for slot in row]
     
     # 计算行数和最大列数
-    rows_count = len(slots_by_row)
-    columns_count = 0
+    rows_count = len(rows)
+    columns_count = count_columns(rows, PROCESS_CONFIG.get('column_gap_tolerance', 0.5))
+    
+    return sorted_slots, rows_count, columns_count
+
+def group_slots_into_rows(slots, row_threshold=30):
+    """
+    将车位按行分组（先按y排序一次，再顺序扫描）
+    
+    每行以该行y坐标最小的车位为基准，y坐标差异小于row_threshold的车位归入同一行。
+    结果只取决于车位坐标本身，与轮廓的返回顺序无关，因此相邻帧的车位编号保持稳定。
+    
+    Args:
+        slots: 停车位列表，每个元素为(x, y, w, h)
+        row_threshold: 同一行的y坐标差异阈值（像素）
+    
+    Returns:
+        rows: 从上到下的行列表，每行内的车位从左到右排序
+    """
+    rows = []
+    for slot in sorted(slots, key=lambda slot: (slot[1], slot[0], slot[2], slot[3])):
+        # 与当前行的基准y坐标足够接近时归入当前行，否则开始新的一行
+        if rows and slot[1] - rows[-1][0][1] < row_threshold:
+            rows[-1].append(slot)
+        else:
+            rows.append([slot])
+    
+    # 在行内按x坐标排序（从左到右）
+    return [sorted(row, key=lambda slot: (slot[0], slot[1])) for row in rows]
+
+def count_columns(rows, column_gap_tolerance=0.5):
+    """
+    计算停车场的列数，允许行内存在缺失的车位
+    
+    以行内相邻车位x间距的中位数作为列间距。当某个间距超过列间距的(1 + column_gap_tolerance)倍时，
+    认为中间缺少了车位，按间距折算列数；行首相对最左侧车位的偏移同样折算。
+    
+    Args:
+        rows: group_slots_into_rows返回的行列表
+        column_gap_tolerance: 列间距容差，为None时直接取每行车位数的最大值
+    
+    Returns:
+        columns_count: 每行的最大列数
+    """
+    if not rows:
+        return 0
+    
+    max_row_length = max(len(row) for row in rows)
+    pitches = [right[0] - left[0] for row in rows for left, right in zip(row, row[1:])]
+    if column_gap_tolerance is None or not pitches:
+        return max_row_length
     
-    # 按照行的y坐标排序（从上到下）
-    for row_y in sorted(slots_by_row.keys()):
-        # 在行内按x坐标排序（从左到右）
-        row_slots = sorted(slots_by_row[row_y], key=lambda slot: slot[0])
-        sorted_slots.extend(row_slots)
+    pitch = float(np.median(pitches))
+    if pitch <= 0:
+        return max_row_length
+    
+    max_gap = pitch * (1 + column_gap_tolerance)
+    min_x = min(row[0][0] for row in rows)
+    
+    columns_count = 0
+    for row in rows:
+        # 行首偏移超过容差时，说明该行左侧缺少车位
+        offset = row[0][0] - min_x
+        column = int(round(offset / pitch)) if offset > pitch * column_gap_tolerance else 0
         
-        # 更新最大列数
-        columns_count = max(columns_count, len(row_slots))
+        for left, right in zip(row, row[1:]):
+            gap = right[0] - left[0]
+            column += int(round(gap / pitch)) if gap > max_gap else 1
+        
+        columns_count = max(columns_count, column + 1)
     
-    return sorted_slots, rows_count, columns_count
+    return max(columns_count, max_row_length)
 
 def check_slot_status(image, slot):
     """
@@ -99,50 +232,94 @@ def check_slot_status(image, slot):
         is_free: 是否空闲
         confidence: 置信度
     """
-    x, y, w, h = slot
-    roi = image[y:y+h, x:x+w]
-    
-    # 转换到HSV颜色空间以便检测绿色
-    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-    
-    # 绿色范围
-    lower_green = np.array([40, 50, 50])
-    upper_green = np.array([80, 255, 255])
+    return classify_slots(image, [slot], scale=1.0)[0]
+
+def classify_slots(image, slots, scale=None):
+    """
+    批量检查所有停车位状态（每帧只做一次HSV转换和掩码计算）
     
-    # 红色范围 (注意红色在HSV中有两个范围)
-    lower_red1 = np.array([0, 50, 50])
-    upper_red1 = np.array([10, 255, 255])
-    lower_red2 = np.array([170, 50, 50])
-    upper_red2 = np.array([180, 255, 255])
+    各车位区域按行拼接成一张条带图（宽度取最宽的车位，不足部分补黑色，黑色不属于任何颜色范围），
+    只对车位内的像素做一次HSV转换和掩码计算，车位之间的间隙不参与。
+    绿色/红色像素数由掩码的每行计数按各车位的起始行分段求和得到，与逐个车位统计的结果完全一致。
+    缩放比例小于1时先缩小车位区域再统计，像素数按比例减少，但绿色/红色的多少关系不变。
     
-    # 创建掩码
-    green_mask = cv2.inRange(hsv, lower_green, upper_green)
-    red_mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-    red_mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-    red_mask = red_mask1 + red_mask2
+    Args:
+        image: 输入图像
+        slots: 停车位列表，每个元素为原图坐标下的(x, y, w, h)
+        scale: 统计时的缩放比例，默认取 PROCESS_CONFIG['analysis_scale']
     
-    # 计算绿色和红色像素数量
-    green_pixels = cv2.countNonZero(green_mask)
-    red_pixels = cv2.countNonZero(red_mask)
+    Returns:
+        statuses: 与slots顺序一致的列表，每个元素为(is_free, confidence)
+    """
+    if not slots:
+        return []
+    
+    # 将车位矩形裁剪到图像范围内（与ROI切片的行为一致）
+    img_h, img_w = image.shape[:2]
+    rects = np.array(slots, dtype=np.int64).reshape(-1, 4)
+    x1 = np.clip(rects[:, 0], 0, img_w)
+    y1 = np.clip(rects[:, 1], 0, img_h)
+    x2 = np.clip(rects[:, 0] + rects[:, 2], x1, img_w)
+    y2 = np.clip(rects[:, 1] + rects[:, 3], y1, img_h)
+    
+    # 缩小覆盖所有车位的外接区域，车位坐标按同一比例换算（并限制在缩小后的区域内）
+    region = image
+    scale = analysis_scale(scale)
+    if scale < 1.0:
+        left, top = int(x1.min()), int(y1.min())
+        region = downscale(image[top:int(y2.max()), left:int(x2.max())], scale)
+        region_h, region_w = region.shape[:2]
+        x1 = np.clip(np.round((x1 - left) * scale).astype(np.int64), 0, region_w)
+        x2 = np.clip(np.round((x2 - left) * scale).astype(np.int64), x1, region_w)
+        y1 = np.clip(np.round((y1 - top) * scale).astype(np.int64), 0, region_h)
+        y2 = np.clip(np.round((y2 - top) * scale).astype(np.int64), y1, region_h)
+    
+    green_pixels = np.zeros(len(rects), dtype=np.int64)
+    red_pixels = np.zeros(len(rects), dtype=np.int64)
+    valid = np.flatnonzero((x2 > x1) & (y2 > y1))
+    if len(valid):
+        # 把各车位区域拼接成条带图
+        heights = (y2 - y1)[valid]
+        starts = np.concatenate(([0], np.cumsum(heights)[:-1]))
+        strip = np.empty((int(heights.sum()), int((x2 - x1)[valid].max()), 3), dtype=np.uint8)
+        for i, start in zip(valid, starts):
+            end, width = start + y2[i] - y1[i], x2[i] - x1[i]
+            strip[start:end, :width] = region[y1[i]:y2[i], x1[i]:x2[i]]
+            strip[start:end, width:] = 0
+        
+        # 整张条带图只转换一次HSV颜色空间；三个颜色范围的饱和度/亮度下限相同，
+        # 用一次饱和度/亮度掩码加色调查找表代替三次三通道的inRange：绿色为1，红色为2，其余为0
+        hsv = cv2.cvtColor(strip, cv2.COLOR_BGR2HSV)
+        classes = cv2.bitwise_and(cv2.LUT(cv2.extractChannel(hsv, 0), HUE_CLASSES),
+                                  cv2.inRange(hsv, LOWER_SATURATION_VALUE, UPPER_SATURATION_VALUE))
+        
+        # 每行的像素数，按车位的起始行分段求和：classes & 1 只保留绿色，classes的总和为 绿色 + 2 * 红色
+        def slot_sums(mask):
+            rows = cv2.reduce(mask, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
+            return np.add.reduceat(rows, starts)
+        
+        green_pixels[valid] = slot_sums(cv2.bitwise_and(classes, 1))
+        red_pixels[valid] = (slot_sums(classes) - green_pixels[valid]) // 2
     
     # 如果绿色像素多于红色像素，则认为车位空闲
     is_free = green_pixels > red_pixels
     
     # 计算置信度
-    total = max(1, green_pixels + red_pixels)  # 避免除以零
-    confidence = max(green_pixels, red_pixels) / total
+    total = np.maximum(1, green_pixels + red_pixels)  # 避免除以零
+    confidence = np.maximum(green_pixels, red_pixels) / total
     
-    return is_free, confidence
+    return [(bool(free), float(conf)) for free, conf in zip(is_free, confidence)]
 
-def process_image(image_path):
+def process_image(image_path, annotate=True):
     """
     处理单张图片
     
     Args:
         image_path: 图片路径
+        annotate: 是否绘制车位标注
     
     Returns:
-        result_image: 处理后的图片
+        result_image: 处理后的图片，annotate为False时为None
         free_count: 空闲车位数量
         free_slots: 空闲车位位置列表
         total_slots: 总车位数
@@ -150,24 +327,103 @@ def process_image(image_path):
         columns_count: 每行的最大列数
     """
     # 读取图片
-    image = cv2.imread(image_path)
+    with metrics.stage_timer('decode'):
+        image = cv2.imread(image_path)
     if image is None:
         raise ValueError(f"无法读取图片: {image_path}")
     
-    # 创建结果图像副本
-    result_image = image.copy()
+    return process_frame(image, annotate=annotate)
+
+def create_layout_cache(parking_layer=None):
+    """
+    创建车位布局缓存，配置中关闭缓存时返回None
+    
+    Args:
+        parking_layer: 停车场层数，默认使用配置中的层数
     
-    # 检测停车位
-    slots, rows_count, columns_count = detect_parking_slots(image)
+    Returns:
+        layout_cache: SlotLayoutCache实例或None
+    """
+    if not PROCESS_CONFIG.get('use_layout_cache', True):
+        return None
+    if parking_layer is None:
+        parking_layer = PROCESS_CONFIG['parking_layer']
+    return SlotLayoutCache(parking_layer, detect_parking_slots)
+
+def process_frame(frame, layout_cache=None, annotate=True, tracker=None):
+    """
+    处理内存中的单帧图像（图片、视频和摄像头模式共用）
+    
+    Args:
+        frame: BGR格式的图像数组，不会被修改
+        layout_cache: 车位布局缓存，为None时每帧重新检测车位
+        annotate: 是否在结果图像上绘制车位标注，不需要输出图像时设为False可省去整帧复制和绘制
+        tracker: 车位状态跟踪器（SlotStateTracker），跨帧平滑车位状态，为None时直接使用单帧判断结果
+    
+    Returns:
+        result_image: 处理后的图片，annotate为False时为None
+        free_count: 空闲车位数量
+        free_slots: 空闲车位位置列表
+        total_slots: 总车位数
+        rows_count: 停车场行数
+        columns_count: 每行的最大列数
+    """
+    try:
+        return _process_frame(frame, layout_cache, annotate, tracker)
+    except Exception:
+        # 图片、视频、摄像头和多摄像头模式的分析失败都在这里计数
+        metrics.FRAMES_FAILED.inc()
+        raise
+
+def _process_frame(frame, layout_cache, annotate, tracker):
+    """process_frame的实现，参数和返回值相同"""
+    # 检测停车位（有布局缓存时只在布局漂移后重新检测）
+    with metrics.stage_timer('detect'):
+        if layout_cache is not None:
+            slots, rows_count, columns_count = layout_cache.get_layout(frame)
+        else:
+            slots, rows_count, columns_count = detect_parking_slots(frame)
     
-    # 分析每个停车位状态
-    free_slots = []
-    free_count = 0
     total_slots = len(slots)  # 总车位数就是检测到的所有车位数量
     
-    for i, slot in enumerate(slots):
+    # 一次性计算所有车位的状态
+    with metrics.stage_timer('classify'):
+        statuses = classify_slots(frame, slots)
+    
+    # 跨帧平滑，短暂的干扰不会改变车位状态
+    if tracker is not None:
+        statuses = tracker.update(slots, statuses)
+    
+    # 更新统计信息（车位编号从1开始）
+    free_slots = [i + 1 for i, (is_free, _) in enumerate(statuses) if is_free]
+    free_count = len(free_slots)
+    
+    # 在副本上绘制标注，避免影响原始帧
+    result_image = None
+    if annotate:
+        with metrics.stage_timer('annotate'):
+            result_image = draw_slot_labels(frame, slots, statuses)
+    
+    metrics.FRAMES_PROCESSED.inc()
+    return result_image, free_count, free_slots, total_slots, rows_count, columns_count
+
+def draw_slot_labels(frame, slots, statuses):
+    """
+    在图像副本上绘制车位框和状态标签
+    
+    Args:
+        frame: 原始图像，不会被修改
+        slots: 停车位列表，每个元素为(x, y, w, h)
+        statuses: classify_slots的返回值
+    
+    Returns:
+        result_image: 带标注的图像副本
+    """
+    # 创建结果图像副本
+    result_image = frame.copy()
+    
+    for i, (slot, (is_free, confidence)) in enumerate(zip(slots, statuses)):
         x, y, w, h = slot
-        is_free, confidence = check_slot_status(image, slot)
         
         # 绘制矩形框
         color = (0, 255, 0) if is_free else (0, 0, 255)  # 绿色表示空闲，红色表示占用
@@ -190,59 +446,186 @@ def process_image(image_path):
         
         # 添加文字
         cv2.putText(result_image, label, (x+5, y-8), font, font_scale, (255, 255, 255), thickness)
-        
-        # 更新统计信息
-        if is_free:
-            free_count += 1
-            free_slots.append(slot_id)  # 车位编号从1开始
     
-    return result_image, free_count, free_slots, total_slots, rows_count, columns_count
+    return result_image
 
-def save_result_image(image, mode, timestamp=None, original_path=None, frame_time=None):
+def add_info_bar(result_image, info_text):
     """
-    保存处理结果图像
+    在处理结果图像底部添加信息栏
+    
+    Args:
+        result_image: 处理后的图像
+        info_text: 信息栏中显示的文本
+    
+    Returns:
+        extended_image: 带信息栏的扩展图像
+    """
+    start_time = time.perf_counter()
+    
+    # 获取原始图像尺寸
+    img_h, img_w = result_image.shape[:2]
+    
+    # 创建一个带有信息栏的扩展图像，底部添加50像素高的信息栏
+    info_bar_height = 50
+    extended_image = np.zeros((img_h + info_bar_height, img_w, 3), dtype=np.uint8)
+    
+    # 填充信息栏部分为深蓝色背景
+    extended_image[img_h:img_h+info_bar_height, 0:img_w] = (100, 50, 0)  # BGR格式，加深颜色
+    
+    # 将原始图像放在信息栏上方
+    extended_image[0:img_h, 0:img_w] = result_image
+    
+    # 在信息栏上添加文本，增加字体大小和粗细
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 1.2  # 增大字体比例
+    thickness = 3     # 增加字体粗细
+    
+    # 计算文本位置，使其在信息栏中居中
+    text_size = cv2.getTextSize(info_text, font, font_scale, thickness)[0]
+    text_x = (img_w - text_size[0]) // 2  # 水平居中
+    text_y = img_h + (info_bar_height + text_size[1]) // 2  # 垂直居中
+    
+    # 添加文本（带黑色描边使其在任何背景下都清晰可见）
+    # 先绘制黑色描边
+    cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (0, 0, 0), thickness+2)
+    # 再绘制白色文字
+    cv2.putText(extended_image, info_text, (text_x, text_y), font, font_scale, (255, 255, 255), thickness)
+    
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - start_time, stage='info_bar')
+    return extended_image
+
+def result_image_path(mode, timestamp=None, original_path=None, frame_time=None):
+    """
+    生成结果图像的保存路径，扩展名由 OUTPUT_CONFIG['format'] 决定
     
     Args:
-        image: 处理后的图像
         mode: 模式 ('image', 'video', 'camera')
         timestamp: 时间戳，默认为当前时间
         original_path: 原始图像路径，用于提取文件名
         frame_time: 视频中的帧时间（秒），用于视频模式
     
     Returns:
-        saved_path: 保存的文件路径
+        output_file: 保存路径
     """
     output_dir = OUTPUT_DIRS[f'{mode}_output']
+    extension = OUTPUT_CONFIG.get('format', 'png').lower()
     
     if mode == 'image' and original_path:
         # 提取原始文件名（不含扩展名）
         original_filename = os.path.splitext(os.path.basename(original_path))[0]
-        output_file = os.path.join(output_dir, f'{original_filename}_processed.png')
+        return os.path.join(output_dir, f'{original_filename}_processed.{extension}')
     elif mode == 'video' and original_path and frame_time is not None:
         # 提取视频文件名（不含扩展名）
         video_filename = os.path.splitext(os.path.basename(original_path))[0]
         # 将帧时间转换为整数秒
         seconds = int(frame_time)
-        output_file = os.path.join(output_dir, f'{video_filename}_{seconds}s.png')
+        return os.path.join(output_dir, f'{video_filename}_{seconds}s.{extension}')
     else:
         # 对于摄像头帧和其他情况，继续使用时间戳
         if timestamp is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = os.path.join(output_dir, f'parking_{timestamp}.png')
+        return os.path.join(output_dir, f'parking_{timestamp}.{extension}')
+
+def encode_params(output_file):
+    """
+    根据文件格式生成 cv2.imwrite 的编码参数
+    
+    Args:
+        output_file: 保存路径
+    
+    Returns:
+        params: 编码参数列表，未配置时为空（使用OpenCV默认值）
+    """
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension == '.png' and OUTPUT_CONFIG.get('png_compression') is not None:
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(OUTPUT_CONFIG['png_compression'])]
+    if extension in ('.jpg', '.jpeg') and OUTPUT_CONFIG.get('jpeg_quality') is not None:
+        return [cv2.IMWRITE_JPEG_QUALITY, int(OUTPUT_CONFIG['jpeg_quality'])]
+    if extension == '.webp' and OUTPUT_CONFIG.get('webp_quality') is not None:
+        return [cv2.IMWRITE_WEBP_QUALITY, int(OUTPUT_CONFIG['webp_quality'])]
+    return []
+
+def write_result_image(image, output_file):
+    """
+    按输出配置缩放并编码图像，写入指定路径
+    
+    Args:
+        image: 需要保存的图像
+        output_file: 保存路径
     
-    cv2.imwrite(output_file, image)
+    Returns:
+        size: 写入的字节数
+    """
+    scale = OUTPUT_CONFIG.get('scale', 1.0)
+    if scale and scale != 1.0:
+        h, w = image.shape[:2]
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    
+    with metrics.stage_timer('save'):
+        if not cv2.imwrite(output_file, image, encode_params(output_file)):
+            raise ValueError(f"无法保存图片: {output_file}")
+    return os.path.getsize(output_file)
+
+def save_result_image(image, mode, timestamp=None, original_path=None, frame_time=None):
+    """
+    保存处理结果图像（同步写入，后台写入和保留策略见 image_writer.ResultImageWriter）
+    
+    Args:
+        image: 处理后的图像
+        mode: 模式 ('image', 'video', 'camera')
+        timestamp: 时间戳，默认为当前时间
+        original_path: 原始图像路径，用于提取文件名
+        frame_time: 视频中的帧时间（秒），用于视频模式
+    
+    Returns:
+        saved_path: 保存的文件路径
+    """
+    output_file = result_image_path(mode, timestamp, original_path, frame_time)
+    write_result_image(image, output_file)
     return output_file
 
-def process_video(video_path):
+def skip_frames(cap, count, seek_mode='grab'):
+    """
+    在视频中向后跳过指定数量的帧
+    
+    Args:
+        cap: cv2.VideoCapture对象
+        count: 需要跳过的帧数
+        seek_mode: 'seek'直接定位到目标帧（速度最快，依赖容器索引），
+                   'grab'逐帧grab（只解码不输出图像，结果与逐帧读取完全一致）
+    
+    Returns:
+        是否成功跳过（到达视频末尾时返回False）
+    """
+    if count <= 0:
+        return True
+    
+    if seek_mode == 'seek':
+        target = cap.get(cv2.CAP_PROP_POS_FRAMES) + count
+        if cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            return True
+        # 定位失败时退回逐帧grab
+    
+    for _ in range(count):
+        if not cap.grab():
+            return False
+    return True
+
+def process_video(video_path, parking_layer=None, annotate=True):
     """
     处理视频文件
     
+    每隔video_interval秒（视频内时间）处理一帧；启用 PROCESS_CONFIG['motion_gate'] 时，
+    画面无变化的帧跳过分析，间隔按视频内时间自适应调整。
+    
     Args:
         video_path: 视频文件路径
+        parking_layer: 视频所属的停车场层数（用于车位布局缓存），默认使用配置中的层数
+        annotate: 是否绘制车位标注
     
     Yields:
         timestamp: 时间戳
-        result_image: 处理后的图片
+        result_image: 处理后的图片，annotate为False时为None
         free_count: 空闲车位数量
         free_slots: 空闲车位位置列表
         frame_time: 当前帧在视频中的时间（秒）
@@ -255,84 +638,131 @@ def process_video(video_path):
     if not cap.isOpened():
         raise ValueError(f"无法打开视频: {video_path}")
     
+    layout_cache = create_layout_cache(parking_layer)
+    tracker = create_slot_tracker()
+    gate = create_motion_gate(os.path.basename(video_path))
+    
     fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_interval = int(fps * 10)  # 每10秒处理一帧
+    if fps <= 0:
+        cap.release()
+        raise ValueError(f"无法获取视频帧率: {video_path}")
+    
+    # 每隔video_interval秒处理一帧
+    frame_interval = max(1, int(fps * PROCESS_CONFIG.get('video_interval', 10)))
+    seek_mode = PROCESS_CONFIG.get('video_seek_mode', 'grab')
     frame_count = 0
     
+    # 下一个需要分析的帧序号（从1开始），首先处理第一帧
+    next_frame = 1
+    
     while cap.isOpened():
-        ret, frame = cap.read()
-        
+        # 跳过两次分析之间的帧，不做完整的解码输出和颜色转换
+        with metrics.stage_timer('decode'):
+            ret = skip_frames(cap, next_frame - 1 - frame_count, seek_mode)
+            if ret:
+                ret, frame = cap.read()
         if not ret:
             break
+        frame_count = next_frame - 1
         
         frame_count += 1
         
         # 计算当前帧在视频中的时间（秒）
         frame_time = frame_count / fps
         
-        # 处理第一帧或每隔指定帧数处理一次
-        if frame_count == 1 or frame_count % frame_interval == 0:
-            # 保存当前帧为临时文件
-            temp_file = 'temp_frame.jpg'
-            cv2.imwrite(temp_file, frame)
-            
-            try:
-                # 处理帧
-                result_image, free_count, free_slots, total_slots, rows_count, columns_count = process_image(temp_file)
-                timestamp = time.time()
-                
-                yield timestamp, result_image, free_count, free_slots, frame_time, total_slots, rows_count, columns_count
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+        if gate is not None:
+            # 运动检测门控：按视频内时间自适应调整间隔，画面无变化时跳过分析
+            analyze = gate.check(frame, frame_time)
+            next_frame = frame_count + max(1, int(fps * gate.interval))
+            if not analyze:
+                continue
+        else:
+            # 之后每隔指定帧数处理一次
+            next_frame = (frame_count // frame_interval + 1) * frame_interval
+        
+        # 直接在内存中处理解码后的帧
+        result_image, free_count, free_slots, total_slots, rows_count, columns_count = process_frame(frame, layout_cache, annotate, tracker)
+        timestamp = time.time()
+        
+        yield timestamp, result_image, free_count, free_slots, frame_time, total_slots, rows_count, columns_count
     
     cap.release()
+    if gate is not None:
+        print(f"运动检测: 检查 {gate.checked} 帧，分析 {gate.analyzed} 帧，跳过 {gate.skipped} 帧")
 
-def process_camera():
+def open_camera(source=None):
+    """
+    打开摄像头或视频流
+    
+    Args:
+        source: 设备编号（如0、"1"）或视频流地址（如rtsp://...），默认取 PROCESS_CONFIG['camera_source']
+    
+    Returns:
+        cap: 已打开的VideoCapture
+    """
+    if source is None:
+        source = PROCESS_CONFIG.get('camera_source', 0)
+    # 纯数字视为本地设备编号
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开摄像头: {source}")
+    return cap
+
+def process_camera(source=None, parking_layer=None, annotate=True):
     """
     处理摄像头输入
     
+    摄像头由后台取帧线程持续读取，每隔camera_interval秒取最新的一帧处理，
+    不会处理驱动缓冲区中积压的旧画面。启用 PROCESS_CONFIG['motion_gate'] 时，
+    画面无变化的帧跳过分析，间隔在sampling_min_interval和sampling_max_interval之间自适应调整。
+    
+    Args:
+        source: 摄像头设备编号或视频流地址，默认取 PROCESS_CONFIG['camera_source']
+        parking_layer: 该摄像头所属的停车场层数，用于选择车位布局缓存
+        annotate: 是否绘制车位标注
+    
     Yields:
-        timestamp: 时间戳
-        result_image: 处理后的图片
+        timestamp: 所处理画面的采集时间戳
+        result_image: 处理后的图片，annotate为False时为None
         free_count: 空闲车位数量
         free_slots: 空闲车位位置列表
         total_slots: 总车位数
         rows_count: 停车场行数
         columns_count: 每行的最大列数
     """
-    cap = cv2.VideoCapture(0)
-    
-    if not cap.isOpened():
-        raise ValueError("无法打开摄像头")
-    
-    last_process_time = 0
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        
-        if not ret:
-            break
-        
-        current_time = time.time()
-        
-        # 每10秒处理一次
-        if current_time - last_process_time >= 10:
-            last_process_time = current_time
+    cap = open_camera(source)
+    
+    layout_cache = create_layout_cache(parking_layer)
+    tracker = create_slot_tracker()
+    gate = create_motion_gate(str(source if source is not None else PROCESS_CONFIG.get('camera_source', 0)))
+    camera_interval = PROCESS_CONFIG.get('camera_interval', 10)
+    read_timeout = PROCESS_CONFIG.get('camera_read_timeout', 5)
+    
+    with LatestFrameGrabber(cap) as grabber:
+        next_process_time = time.time()
+        while True:
+            # 等到下一个处理时间点再取最新画面
+            wait_time = next_process_time - time.time()
+            if wait_time > 0:
+                time.sleep(wait_time)
             
-            # 保存当前帧为临时文件
-            temp_file = 'temp_frame.jpg'
-            cv2.imwrite(temp_file, frame)
+            ret, frame, capture_time = grabber.read(timeout=read_timeout)
+            if not ret:
+                break
             
-            try:
-                # 处理帧
-                result_image, free_count, free_slots, total_slots, rows_count, columns_count = process_image(temp_file)
-                
-                yield current_time, result_image, free_count, free_slots, total_slots, rows_count, columns_count
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-    
-    cap.release()
+            if gate is not None:
+                # 运动检测门控：画面无变化时跳过分析，并自适应调整下一次检查的间隔
+                analyze = gate.check(frame, capture_time)
+                next_process_time = capture_time + gate.interval
+                if not analyze:
+                    continue
+            else:
+                next_process_time = capture_time + camera_interval
+            
+            # 直接在内存中处理解码后的帧
+            result_image, free_count, free_slots, total_slots, rows_count, columns_count = process_frame(frame, layout_cache, annotate, tracker)
+            
+            yield capture_time, result_image, free_count, free_slots, total_slots, rows_count, columns_count
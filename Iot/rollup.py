@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+import numpy as np
+
+# 汇总行中代表整层的车位号
+LAYER_SLOT = 0
+
+class _Bucket:
+    """一个时间桶内各车位的累计值"""
+
+    def __init__(self, start, total_slots):
+        self.start = start
+        self.observed = np.zeros(total_slots)
+        self.occupied = np.zeros(total_slots)
+        self.arrivals = np.zeros(total_slots, dtype=np.int64)
+        self.departures = np.zeros(total_slots, dtype=np.int64)
+        self.dwell_count = np.zeros(total_slots, dtype=np.int64)
+        self.dwell_seconds = np.zeros(total_slots)
+
+class OccupancyRollup:
+    """
+    车位占用率的流式汇总
+
+    每收到一帧结果，把距上一帧的时间按上一帧的状态计入各车位所在的时间桶（跨桶时按边界拆分），
+    并统计车位的驶入（空闲→占用）、驶离（占用→空闲）次数和驶离时的停留时长。
+    只保存每个车位的当前状态、驶入时间和当前时间桶的累计值，内存占用与车位数成正比，与运行时长无关；
+    时间桶结束时生成汇总行，由调用方写入数据库。
+    """
+
+    def __init__(self, bucket_seconds=(300, 3600), max_gap=120):
+        """
+        Args:
+            bucket_seconds: 时间桶长度（秒），需能整除一天，例如 (300, 3600) 同时按5分钟和1小时汇总
+            max_gap: 相邻两帧间隔超过该秒数时，中间的时间不计入观测时长（摄像头断开、程序暂停等）
+        """
+        for seconds in bucket_seconds:
+            if seconds <= 0 or 86400 % seconds:
+                raise ValueError(f"时间桶长度需能整除一天: {seconds}")
+        self.bucket_seconds = tuple(bucket_seconds)
+        self.max_gap = max_gap
+
+        self._total_slots = None
+        self._occupied = None
+        self._arrived_at = None
+        self._last_time = None
+        self._buckets = {}
+        self._rows = []
+
+    def update(self, timestamp, occupied):
+        """
+        输入一帧结果
+
+        Args:
+            timestamp: 该帧的时间戳（秒）
+            occupied: 长度为总车位数的bool数组，True为占用，顺序与车位号一致
+        """
+        occupied = np.asarray(occupied, dtype=bool)
+        if self._total_slots != len(occupied):
+            # 首帧或车位布局变化：结束当前所有时间桶，以本帧为初始状态，驶入时间未知
+            self.close_buckets()
+            self._total_slots = len(occupied)
+            self._occupied = occupied
+            self._arrived_at = np.full(len(occupied), np.nan)
+            self._last_time = timestamp
+            return
+
+        # 上一帧到本帧之间按上一帧的状态计时；时间倒退（时钟调整）时不计时
+        elapsed = timestamp - self._last_time
+        if 0 < elapsed <= self.max_gap:
+            for seconds in self.bucket_seconds:
+                self._accumulate(seconds, self._last_time, timestamp)
+
+        arrivals = occupied & ~self._occupied
+        departures = self._occupied & ~occupied
+        if arrivals.any() or departures.any():
+            # 只有观测到驶入时间的车辆才统计停留时长
+            dwell = np.where(departures, timestamp - self._arrived_at, np.nan)
+            completed = ~np.isnan(dwell)
+            for seconds in self.bucket_seconds:
+                bucket = self._bucket(seconds, timestamp)
+                bucket.arrivals += arrivals
+                bucket.departures += departures
+                bucket.dwell_count += completed
+                bucket.dwell_seconds += np.where(completed, dwell, 0)
+            self._arrived_at[arrivals] = timestamp
+            self._arrived_at[departures] = np.nan
+
+        self._occupied = occupied
+        self._last_time = max(self._last_time, timestamp)
+
+    def pop_rows(self):
+        """
+        取出已结束时间桶的汇总行
+
+        Returns:
+            rows: [(bucket_start, bucket_seconds, slot_number, observed_seconds, occupied_seconds,
+                    arrivals, departures, dwell_count, dwell_seconds), ...]，
+                  bucket_start为本地时间的datetime，slot_number为0的行是整层的合计（时长为车位·秒）
+        """
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close_buckets(self):
+        """结束所有未结束的时间桶（程序退出前调用），其汇总行可通过pop_rows取出"""
+        for seconds in list(self._buckets):
+            self._close(seconds)
+
+    def restart(self):
+        """结束所有时间桶并清空车位状态，下一帧作为新的初始状态（切换到另一段视频时调用）"""
+        self.close_buckets()
+        self._total_slots = None
+        self._occupied = None
+        self._arrived_at = None
+        self._last_time = None
+
+    def _bucket_start(self, seconds, timestamp):
+        """时间戳所在时间桶的开始时间戳，按本地时间对齐（整点、整5分钟）"""
+        local = datetime.fromtimestamp(timestamp)
+        midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        since_midnight = (local - midnight).total_seconds()
+        # 由当天零点加整数倍桶长得到，同一时间桶内的时间戳得到完全相同的值
+        return midnight.timestamp() + since_midnight // seconds * seconds
+
+    def _bucket(self, seconds, timestamp):
+        """获取时间戳所在的时间桶，进入新的时间桶时结束之前的时间桶"""
+        start = self._bucket_start(seconds, timestamp)
+        bucket = self._buckets.get(seconds)
+        if bucket is not None and bucket.start != start:
+            self._close(seconds)
+            bucket = None
+        if bucket is None:
+            bucket = self._buckets[seconds] = _Bucket(start, self._total_slots)
+        return bucket
+
+    def _accumulate(self, seconds, start, end):
+        """把[start, end)按上一帧的状态计入时间桶，跨越桶边界时拆分"""
+        while start < end:
+            bucket = self._bucket(seconds, start)
+            segment_end = min(end, bucket.start + seconds)
+            duration = segment_end - start
+            bucket.observed += duration
+            bucket.occupied += duration * self._occupied
+            start = segment_end
+
+    def _close(self, seconds):
+        """结束一个时间桶，生成各车位及整层的汇总行"""
+        bucket = self._buckets.pop(seconds)
+        start = datetime.fromtimestamp(bucket.start)
+        active = (bucket.observed > 0) | (bucket.arrivals > 0) | (bucket.departures > 0)
+        if not active.any():
+            return
+
+        self._rows.append((
+            start, seconds, LAYER_SLOT,
+            float(bucket.observed.sum()), float(bucket.occupied.sum()),
+            int(bucket.arrivals.sum()), int(bucket.departures.sum()),
+            int(bucket.dwell_count.sum()), float(bucket.dwell_seconds.sum())
+        ))
+        for index in np.flatnonzero(active):
+            self._rows.append((
+                start, seconds, int(index) + 1,
+                float(bucket.observed[index]), float(bucket.occupied[index]),
+                int(bucket.arrivals[index]), int(bucket.departures[index]),
+                int(bucket.dwell_count[index]), float(bucket.dwell_seconds[index])
+            ))
+
+def occupied_from_bitmap(free_bitmap, total_slots):
+    """把空闲车位位图转换为占用状态数组（True为占用）"""
+    free = np.unpackbits(np.frombuffer(free_bitmap, dtype=np.uint8), bitorder='little')[:total_slots]
+    return free == 0
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+空闲车位位图
+
+每个车位占1位，车位号与detect_parking_slots排序后的顺序一致（从1开始），
+第n号车位对应第(n-1)//8个字节的第(n-1)%8位（低位在前），1为空闲，0为占用。
+位图长度固定为ceil(总车位数/8)字节，同一布局下的两个位图按位异或即可得到状态变化的车位。
+"""
+
+def bitmap_size(total_slots):
+    """总车位数对应的位图字节数"""
+    return (total_slots + 7) // 8
+
+def encode_free_bitmap(free_positions, total_slots):
+    """
+    把空闲车位列表编码为位图
+
+    Args:
+        free_positions: 空闲车位号列表（从1开始）
+        total_slots: 总车位数
+
+    Returns:
+        bitmap: bytes，长度为bitmap_size(total_slots)
+    """
+    value = 0
+    for slot_number in free_positions:
+        if not 1 <= slot_number <= total_slots:
+            raise ValueError(f"车位号超出范围: {slot_number}/{total_slots}")
+        value |= 1 << (slot_number - 1)
+    return value.to_bytes(bitmap_size(total_slots), 'little')
+
+def decode_free_bitmap(bitmap):
+    """
+    把位图解码为空闲车位列表
+
+    Returns:
+        free_positions: 按车位号升序排列的空闲车位号列表
+    """
+    value = int.from_bytes(bitmap, 'little')
+    return _set_bits(value)
+
+def is_slot_free(bitmap, slot_number):
+    """查询单个车位是否空闲，车位号超出位图范围时返回False"""
+    index = slot_number - 1
+    if index < 0 or index // 8 >= len(bitmap):
+        return False
+    return bool(bitmap[index // 8] >> (index % 8) & 1)
+
+def diff_free_bitmaps(previous, current):
+    """
+    比较同一布局的两个位图
+
+    Args:
+        previous: 之前的位图
+        current: 当前的位图
+
+    Returns:
+        changes: 状态变化的车位 [(slot_number, is_free), ...]，is_free为当前状态，按车位号升序排列
+    """
+    if len(previous) != len(current):
+        raise ValueError(f"位图长度不同，无法比较: {len(previous)}/{len(current)}")
+    current_value = int.from_bytes(current, 'little')
+    changed = int.from_bytes(previous, 'little') ^ current_value
+    return [(slot_number, bool(current_value >> (slot_number - 1) & 1)) for slot_number in _set_bits(changed)]
+
+def _set_bits(value):
+    """整数中为1的位对应的车位号（从1开始）"""
+    slot_numbers = []
+    while value:
+        low_bit = value & -value
+        slot_numbers.append(low_bit.bit_length())
+        value ^= low_bit
+    return slot_numbers
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+
+import numpy as np
+
+from config import PROCESS_CONFIG
+
+class SlotStateTracker:
+    """
+    车位状态的跨帧平滑
+
+    单帧判断容易被行人、车灯扫过等短暂干扰翻转，造成一次数据库写入和前端状态跳变。
+    跟踪器为每个车位保存最近的观测，只有在变化持续出现时才切换状态（迟滞）：
+        'vote': 最近window次观测中至少votes次与当前状态相反才切换，置信度低于min_confidence的观测不参与投票，
+                切换后重新开始计票
+        'ema': 对"空闲概率"做指数滑动平均，高于free_threshold切换为空闲，低于occupied_threshold切换为占用
+    每帧重新检测车位时矩形会有几个像素的抖动，因此按车位中心匹配前后两帧的车位：
+    车位数相同且每个车位都能在match_distance内找到唯一对应的车位时保留历史，
+    车位数变化或无法匹配（布局真正变化）时才清空历史，以新布局的第一次观测为初始状态。
+    """
+
+    def __init__(self, method=None, window=None, votes=None, min_confidence=None,
+                 alpha=None, free_threshold=None, occupied_threshold=None, match_distance=None):
+        """
+        Args:
+            method: 'vote' 或 'ema'，默认取 PROCESS_CONFIG['slot_smoothing']
+            window: 投票窗口大小M，默认取 PROCESS_CONFIG['smoothing_window']
+            votes: 切换状态所需的票数N，默认取 PROCESS_CONFIG['smoothing_votes']
+            min_confidence: 参与投票的最低置信度，默认取 PROCESS_CONFIG['smoothing_min_confidence']
+            alpha: EMA的平滑系数，越大越跟随当前帧，默认取 PROCESS_CONFIG['smoothing_alpha']
+            free_threshold: EMA高于该值时切换为空闲
+            occupied_threshold: EMA低于该值时切换为占用
+            match_distance: 前后两帧视为同一车位的最大中心距离（像素），默认取 PROCESS_CONFIG['row_threshold']
+        """
+        self.method = method if method is not None else (PROCESS_CONFIG.get('slot_smoothing') or 'vote')
+        if self.method not in ('vote', 'ema'):
+            raise ValueError(f"未知的车位状态平滑方法: {self.method}")
+
+        self.window = window if window is not None else PROCESS_CONFIG.get('smoothing_window', 3)
+        self.votes = votes if votes is not None else PROCESS_CONFIG.get('smoothing_votes', 2)
+        if not 0 < self.votes <= self.window:
+            raise ValueError(f"投票数应在1到窗口大小之间: {self.votes}/{self.window}")
+        self.min_confidence = min_confidence if min_confidence is not None else PROCESS_CONFIG.get('smoothing_min_confidence', 0.6)
+        self.alpha = alpha if alpha is not None else PROCESS_CONFIG.get('smoothing_alpha', 0.5)
+        if not 0 < self.alpha <= 1:
+            raise ValueError(f"EMA平滑系数应在0到1之间: {self.alpha}")
+        self.free_threshold = free_threshold if free_threshold is not None else PROCESS_CONFIG.get('smoothing_free_threshold', 0.65)
+        self.occupied_threshold = occupied_threshold if occupied_threshold is not None else PROCESS_CONFIG.get('smoothing_occupied_threshold', 0.35)
+        self.match_distance = match_distance if match_distance is not None else PROCESS_CONFIG.get('row_threshold', 30)
+
+        self._slots = None
+        self._states = []
+        self._history = []
+        self._scores = []
+
+        # 被平滑掉的单帧翻转次数和实际输出的状态切换次数
+        self.suppressed = 0
+        self.transitions = 0
+
+    def reset(self):
+        """清空所有车位的历史"""
+        self._slots = None
+        self._states = []
+        self._history = []
+        self._scores = []
+
+    def update(self, slots, statuses):
+        """
+        输入当前帧的单帧判断结果，返回平滑后的状态
+
+        Args:
+            slots: 当前帧的车位列表，用于判断布局是否变化
+            statuses: classify_slots的返回值 [(is_free, confidence), ...]
+
+        Returns:
+            smoothed: 与statuses顺序一致的 [(is_free, confidence), ...]，
+                      confidence为当前帧的置信度（EMA方法下为平滑后的空闲/占用概率）
+        """
+        slots = list(slots)
+        order = self._match_slots(slots)
+        if order is None:
+            # 布局变化：以当前帧为初始状态
+            self._slots = slots
+            self._states = [is_free for is_free, _ in statuses]
+            self._history = [deque([is_free], maxlen=self.window) for is_free, _ in statuses]
+            self._scores = [self._free_probability(is_free, confidence) for is_free, confidence in statuses]
+            return list(statuses)
+
+        # 按匹配结果把历史重新排列为当前帧的车位顺序
+        if order != list(range(len(order))):
+            self._states = [self._states[i] for i in order]
+            self._history = [self._history[i] for i in order]
+            self._scores = [self._scores[i] for i in order]
+        self._slots = slots
+
+        smoothed = []
+        for i, (is_free, confidence) in enumerate(statuses):
+            if self.method == 'vote':
+                state = self._update_vote(i, is_free, confidence)
+                smoothed.append((state, confidence))
+            else:
+                state, score = self._update_ema(i, is_free, confidence)
+                smoothed.append((state, score if state else 1 - score))
+
+            if state != self._states[i]:
+                self.transitions += 1
+            elif state != is_free:
+                self.suppressed += 1
+            self._states[i] = state
+        return smoothed
+
+    def _match_slots(self, slots):
+        """
+        按车位中心把当前帧的车位与上一帧的车位一一对应
+
+        Returns:
+            order: 当前帧第i个车位对应上一帧的第order[i]个车位，车位数不同或无法一一对应时返回None
+        """
+        if self._slots is None or len(slots) != len(self._slots):
+            return None
+        if slots == self._slots:
+            return list(range(len(slots)))
+
+        def centres(rects):
+            rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+            return rects[:, :2] + rects[:, 2:] / 2
+
+        distances = np.linalg.norm(centres(slots)[:, None, :] - centres(self._slots)[None, :, :], axis=2)
+        order = distances.argmin(axis=1)
+        if len(set(order.tolist())) != len(order) or distances[np.arange(len(order)), order].max() > self.match_distance:
+            return None
+        return order.tolist()
+
+    @staticmethod
+    def _free_probability(is_free, confidence):
+        """把(是否空闲, 置信度)换算为空闲概率"""
+        return confidence if is_free else 1 - confidence
+
+    def _update_vote(self, index, is_free, confidence):
+        """N-of-M投票：与当前状态相反的观测达到votes次才切换"""
+        history = self._history[index]
+        if confidence >= self.min_confidence:
+            history.append(is_free)
+        state = self._states[index]
+        opposite = sum(1 for observed in history if observed != state)
+        if opposite < self.votes:
+            return state
+        # 切换后清空历史，只有切换之后的观测参与下一次投票，否则切换前的旧观测会让状态立即翻转回去
+        history.clear()
+        return not state
+
+    def _update_ema(self, index, is_free, confidence):
+        """空闲概率的指数滑动平均，上下阈值之间保持原状态"""
+        score = self.alpha * self._free_probability(is_free, confidence) + (1 - self.alpha) * self._scores[index]
+        self._scores[index] = score
+        state = self._states[index]
+        if score >= self.free_threshold:
+            state = True
+        elif score <= self.occupied_threshold:
+            state = False
+        return state, score
+
+def create_slot_tracker():
+    """根据配置创建车位状态跟踪器，PROCESS_CONFIG['slot_smoothing']未启用时返回None"""
+    if not PROCESS_CONFIG.get('slot_smoothing'):
+        return None
+    return SlotStateTracker()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+import threading
+
+class LocalSpool:
+    """
+    本地追加式缓存（SQLite）
+
+    MySQL不可用时，分析结果写入本地磁盘而不是保存在内存中；连接恢复后按写入顺序批量回放。
+    每条记录带有唯一的record_uid，数据库端按该字段去重，因此回放中断后重复回放不会产生重复记录。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: SQLite文件路径
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        # 同一进程内可能有多个线程（上传线程、主线程）访问，用锁串行化
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            # WAL模式下追加写入不会阻塞读取，synchronous=NORMAL在掉电时最多丢失最后一个事务
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS spool (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    parking_layer TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_spool_layer ON spool (parking_layer, id)")
+            self._connection.commit()
+
+    def append(self, parking_layer, rows):
+        """
+        追加记录
+
+        Args:
+            parking_layer: 停车场层数
+            rows: 记录列表，每条记录为可JSON序列化的列表
+        """
+        with self._lock:
+            self._connection.executemany(
+                "INSERT INTO spool (parking_layer, payload) VALUES (?, ?)",
+                [(parking_layer, json.dumps(row)) for row in rows]
+            )
+            self._connection.commit()
+
+    def peek(self, parking_layer, limit):
+        """
+        按写入顺序读取最早的一批记录（不删除）
+
+        Args:
+            parking_layer: 停车场层数
+            limit: 最多读取的记录数
+
+        Returns:
+            entries: [(spool_id, row), ...]
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT id, payload FROM spool WHERE parking_layer = ? ORDER BY id LIMIT ?",
+                (parking_layer, limit)
+            )
+            return [(spool_id, json.loads(payload)) for spool_id, payload in cursor.fetchall()]
+
+    def remove(self, spool_ids):
+        """删除已成功回放的记录"""
+        if not spool_ids:
+            return
+        with self._lock:
+            self._connection.executemany("DELETE FROM spool WHERE id = ?", [(spool_id,) for spool_id in spool_ids])
+            self._connection.commit()
+
+    def count(self, parking_layer=None):
+        """缓存中等待回放的记录数"""
+        with self._lock:
+            if parking_layer is None:
+                cursor = self._connection.execute("SELECT COUNT(*) FROM spool")
+            else:
+                cursor = self._connection.execute("SELECT COUNT(*) FROM spool WHERE parking_layer = ?", (parking_layer,))
+            return cursor.fetchone()[0]
+
+    def close(self):
+        """关闭缓存文件"""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地车位状态服务
+
+IoT端在内存中保存每层的最新结果，通过一个asyncio HTTP服务直接提供给前端，读取不经过MySQL：
+    GET /status            所有层的最新状态
+    GET /status/<层数>     某层的最新状态，格式与 parking_status.php 的返回值一致（不含预约信息）
+    GET /events            Server-Sent Events，任意层车位状态变化时推送该层的最新状态
+    GET /events/<层数>     只推送某层的变化
+
+/status 支持ETag/If-None-Match（未变化时返回304），并支持长轮询：
+带 ?wait=秒数 且 If-None-Match 与当前ETag相同时，等到状态变化或超时再返回。
+只有车位状态（空闲车位集合或布局）变化时版本号才会增加，结果相同的帧不会触发推送。
+"""
+
+import json
+import asyncio
+import threading
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+# 长轮询的最长等待秒数
+MAX_WAIT = 60
+
+# SSE连接在没有变化时发送注释行的间隔（秒），避免被代理断开
+KEEPALIVE_INTERVAL = 15
+
+# 读取请求头的超时秒数
+HEADER_TIMEOUT = 10
+
+class StatusBoard:
+    """
+    各层最新结果的内存存储
+
+    检测/上传线程调用publish发布结果，状态服务读取。版本号在所有层之间全局递增，
+    每次某层车位状态变化加一，因此既可以作为单层的ETag，也可以作为SSE的事件ID。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entries = {}
+        self._listeners = []
+        self._all_body = None
+
+    def publish(self, parking_layer, timestamp, total_slots, free_slots, free_positions,
+                source_type=None, parking_rows=None, parking_columns=None):
+        """
+        发布一层的最新结果，参数与 ParkingDatabase.upload_result 相同
+
+        Returns:
+            changed: 车位状态是否变化（未变化时不更新版本号，也不通知客户端）
+        """
+        state = (frozenset(free_positions), total_slots, parking_rows, parking_columns)
+        with self._lock:
+            entry = self._entries.get(parking_layer)
+            if entry is not None and entry['state'] == state:
+                return False
+
+            self._version += 1
+            payload = self._build_payload(parking_layer, self._version, timestamp, total_slots, free_slots,
+                                          free_positions, source_type, parking_rows, parking_columns)
+            self._entries[parking_layer] = {
+                'version': self._version,
+                'state': state,
+                'payload': payload,
+                'body': json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            }
+            self._all_body = None
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            listener()
+        return True
+
+    def get(self, parking_layer=None):
+        """
+        获取最新状态
+
+        Args:
+            parking_layer: 层数，None表示所有层
+
+        Returns:
+            version: 版本号（该层没有结果时为0）
+            body: JSON响应体（该层没有结果时为None）
+        """
+        with self._lock:
+            if parking_layer is not None:
+                entry = self._entries.get(parking_layer)
+                return (entry['version'], entry['body']) if entry else (0, None)
+
+            if self._all_body is None:
+                self._all_body = json.dumps({
+                    'success': True,
+                    'version': self._version,
+                    'floors': {layer.upper(): entry['payload'] for layer, entry in sorted(self._entries.items())}
+                }, ensure_ascii=False).encode('utf-8')
+            return self._version, self._all_body
+
+    def changes_since(self, version, parking_layer=None):
+        """
+        获取版本号大于version的各层状态，按版本号排列
+
+        Returns:
+            changes: [(version, body), ...]
+        """
+        with self._lock:
+            entries = [entry for layer, entry in self._entries.items()
+                       if entry['version'] > version and parking_layer in (None, layer)]
+        return [(entry['version'], entry['body']) for entry in sorted(entries, key=lambda entry: entry['version'])]
+
+    def add_listener(self, listener):
+        """注册状态变化回调（在发布结果的线程中调用，不能阻塞）"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners.remove(listener)
+
+    @staticmethod
+    def _build_payload(parking_layer, version, timestamp, total_slots, free_slots,
+                       free_positions, source_type, parking_rows, parking_columns):
+        """生成与 parking_status.php 相同字段的状态"""
+        if isinstance(timestamp, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp)
+        free_set = set(free_positions)
+
+        # 与parking_status.php相同，按行列生成车位；没有行列信息时按总车位数生成
+        rows = parking_rows or 0
+        columns = parking_columns or 0
+        slots = []
+        if rows > 0 and columns > 0:
+            for slot_id in range(1, rows * columns + 1):
+                slots.append({
+                    'slotNumber': slot_id,
+                    'slotId': slot_id,
+                    'row': (slot_id - 1) // columns + 1,
+                    'col': (slot_id - 1) % columns + 1,
+                    'status': 'free' if slot_id in free_set else 'occupied'
+                })
+        else:
+            for slot_id in range(1, total_slots + 1):
+                slots.append({
+                    'slotNumber': slot_id,
+                    'slotId': slot_id,
+                    'row': None,
+                    'col': None,
+                    'status': 'free' if slot_id in free_set else 'occupied'
+                })
+
+        return {
+            'success': True,
+            'floor': parking_layer.upper(),
+            'floorName': parking_layer.upper(),
+            'rows': rows,
+            'columns': columns,
+            'totalSlots': total_slots,
+            'freeSlots': free_slots,
+            'occupiedSlots': total_slots - free_slots,
+            'freePositions': sorted(free_set),
+            'slots': slots,
+            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'sourceType': source_type,
+            'version': version,
+            'source': 'edge'
+        }
+
+# 进程内共享的状态存储，检测循环向其发布结果
+BOARD = StatusBoard()
+
+class StatusServer:
+    """在后台线程的asyncio事件循环中运行的状态服务"""
+
+    def __init__(self, port, host='127.0.0.1', board=BOARD):
+        """
+        Args:
+            port: 监听端口，0表示由系统分配
+            host: 监听地址，默认只监听本机
+            board: 状态存储
+        """
+        self.host = host
+        self.port = port
+        self.board = board
+        self._loop = None
+        self._stopping = None
+        self._changed = None
+        self._clients = set()
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="status-http", daemon=True)
+
+    def start(self):
+        """启动服务，端口被占用等错误在此抛出"""
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def shutdown(self):
+        """关闭所有连接并停止服务"""
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._changed = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+
+        self.port = server.sockets[0].getsockname()[1]
+        self.board.add_listener(self._on_publish)
+        self._ready.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            self.board.remove_listener(self._on_publish)
+            server.close()
+            # SSE和长轮询连接不会自行结束，需要取消
+            for task in list(self._clients):
+                task.cancel()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+            await server.wait_closed()
+
+    def _on_publish(self):
+        """在发布结果的线程中调用，切换到事件循环中唤醒等待的连接"""
+        try:
+            self._loop.call_soon_threadsafe(self._notify)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _wait_for_change(self, timeout):
+        """等待下一次状态变化，超时返回False"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _handle(self, reader, writer):
+        """处理一个HTTP连接（每个连接只处理一个请求）"""
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                return
+            method, target, _ = parts
+
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            url = urlsplit(target)
+            path = [part for part in url.path.split('/') if part]
+            query = parse_qs(url.query)
+
+            if method == 'OPTIONS':
+                await self._respond(writer, HTTPStatus.NO_CONTENT)
+            elif method not in ('GET', 'HEAD'):
+                await self._respond(writer, HTTPStatus.METHOD_NOT_ALLOWED)
+            elif path and path[0] == 'status' and len(path) <= 2:
+                await self._handle_status(writer, method, self._layer(path), headers, query)
+            elif path and path[0] == 'events' and len(path) <= 2:
+                await self._handle_events(writer, self._layer(path), headers, query)
+            else:
+                await self._respond(writer, HTTPStatus.NOT_FOUND)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # 服务关闭时取消的连接正常结束，不作为异常上报
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    @staticmethod
+    def _layer(path):
+        """路径中的层数，例如 /status/B1 -> 'b1'"""
+        return path[1].lower() if len(path) > 1 else None
+
+    async def _handle_status(self, writer, method, parking_layer, headers, query):
+        """最新状态，支持ETag和长轮询"""
+        if_none_match = headers.get('if-none-match')
+        try:
+            wait = min(float(query.get('wait', ['0'])[0]), MAX_WAIT)
+        except ValueError:
+            wait = 0
+
+        version, body = self.board.get(parking_layer)
+        etag = f'"{parking_layer or "all"}-{version}"'
+        if wait > 0 and if_none_match == etag:
+            deadline = self._loop.time() + wait
+            while etag == if_none_match:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0 or not await self._wait_for_change(remaining):
+                    break
+                version, body = self.board.get(parking_layer)
+                etag = f'"{parking_layer or "all"}-{version}"'
+
+        if body is None:
+            await self._respond(writer, HTTPStatus.NOT_FOUND, json.dumps({
+                'success': False,
+                'error': f'层数 {parking_layer} 暂无检测结果'
+            }, ensure_ascii=False).encode('utf-8'))
+            return
+
+        extra = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if if_none_match == etag:
+            await self._respond(writer, HTTPStatus.NOT_MODIFIED, headers=extra)
+        else:
+            await self._respond(writer, HTTPStatus.OK, body, headers=extra, head=(method == 'HEAD'))
+
+    async def _handle_events(self, writer, parking_layer, headers, query):
+        """Server-Sent Events：先推送当前状态（断线重连时只推送Last-Event-ID之后的变化），之后只推送变化"""
+        try:
+            last_id = int(headers.get('last-event-id') or query.get('lastEventId', ['0'])[0])
+        except ValueError:
+            last_id = 0
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream; charset=utf-8\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Access-Control-Allow-Origin: *\r\n'
+            b'Connection: close\r\n'
+            b'\r\n'
+            b'retry: 3000\n\n'
+        )
+        await writer.drain()
+
+        while True:
+            # 先取得当前的等待事件再读取变化，读取之后发布的变化不会被错过
+            changed = self._changed
+            for version, body in self.board.changes_since(last_id, parking_layer):
+                writer.write(b'id: %d\nevent: status\ndata: %s\n\n' % (version, body))
+                last_id = version
+            await writer.drain()
+
+            try:
+                await asyncio.wait_for(changed.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                writer.write(b': keepalive\n\n')
+                await writer.drain()
+
+    async def _respond(self, writer, status, body=b'', headers=None, head=False):
+        """写入一个完整的HTTP响应"""
+        lines = [
+            f'HTTP/1.1 {status.value} {status.phrase}',
+            'Access-Control-Allow-Origin: *',
+            'Access-Control-Allow-Methods: GET, OPTIONS',
+            'Access-Control-Allow-Headers: If-None-Match, Last-Event-ID',
+            'Access-Control-Expose-Headers: ETag',
+            'Connection: close'
+        ]
+        if body:
+            lines.append('Content-Type: application/json; charset=utf-8')
+            lines.append(f'Content-Length: {len(body)}')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body and not head:
+            writer.write(body)
+        await writer.drain()
+
+def start_status_server(port, host='127.0.0.1', board=BOARD):
+    """
+    在后台线程中启动状态服务
+
+    Args:
+        port: 监听端口
+        host: 监听地址，默认只监听本机
+
+    Returns:
+        server: StatusServer实例，调用shutdown()停止
+    """
+    server = StatusServer(port, host, board).start()
+    print(f"车位状态服务已启动: http://{host}:{server.port}/status")
+    return server
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import importlib.util
+from importlib.machinery import SourceFileLoader
+
+IOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, IOT_DIR)
+
+# 未创建config.py时使用示例配置
+try:
+    import config  # noqa: F401
+except ImportError:
+    loader = SourceFileLoader('config', os.path.join(IOT_DIR, 'config.py.example'))
+    spec = importlib.util.spec_from_loader('config', loader)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
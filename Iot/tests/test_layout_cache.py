@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import os
+
+import cv2
+import numpy as np
+
+from config import PROCESS_CONFIG
+from layout_cache import SlotLayoutCache
+import process
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'origin', 'images')
+
+def make_frame():
+    frame = np.zeros((240, 480, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (40, 40), (140, 200), (0, 255, 0), 2)
+    return frame
+
+def test_layout_is_redetected_when_detection_config_changes(tmp_path, monkeypatch):
+    calls = []
+
+    def detector(frame):
+        calls.append(frame.shape)
+        return [(40, 40, 100, 160)], 1, 1
+
+    frame = make_frame()
+    SlotLayoutCache('b1', detector, cache_dir=str(tmp_path), recheck_frames=0).get_layout(frame)
+    SlotLayoutCache('b1', detector, cache_dir=str(tmp_path), recheck_frames=0).get_layout(frame)
+    assert len(calls) == 1
+
+    monkeypatch.setitem(PROCESS_CONFIG, 'roi_polygons', [[(0, 0), (0.5, 0), (0.5, 1), (0, 1)]])
+    SlotLayoutCache('b1', detector, cache_dir=str(tmp_path), recheck_frames=0).get_layout(frame)
+    assert len(calls) == 2
+
+def test_periodic_recheck_restores_missing_slots(tmp_path):
+    frame = cv2.imread(os.path.join(IMAGE_DIR, 'layerb2_1.png'))
+    detected = process.detect_parking_slots(frame, scale=1.0)
+    assert len(detected[0]) == 15
+
+    # 首次检测漏掉了大部分车位，漂移检查仍然认为布局有效
+    partial = iter([(detected[0][:5], 1, 5)])
+    cache = SlotLayoutCache('b2', lambda image: next(partial, detected), cache_dir=str(tmp_path), recheck_frames=3)
+    assert len(cache.get_layout(frame)[0]) == 5
+    assert not cache.is_stale(frame)
+
+    layouts = [len(cache.get_layout(frame)[0]) for _ in range(3)]
+    assert layouts == [5, 5, 15]
+
+    # 从磁盘加载的布局在第一帧就完整检测一次
+    reloaded = SlotLayoutCache('b2', lambda image: detected, cache_dir=str(tmp_path), recheck_frames=3)
+    assert len(reloaded.get_layout(frame)[0]) == 15
+    assert reloaded.recheck_count == 1
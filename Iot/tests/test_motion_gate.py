@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from motion_gate import MotionGate
+
+def test_explicit_zero_is_not_replaced_by_default():
+    gate = MotionGate(min_interval=1, max_interval=8, threshold=0, pixel_threshold=0, scale=0.5)
+    assert gate.threshold == 0
+    assert gate.pixel_threshold == 0
+
+    # 阈值为0时每一帧都视为有运动
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    assert all(gate.check(frame, t) for t in range(5))
+    assert gate.interval == 1
+
+    with pytest.raises(ValueError):
+        MotionGate(min_interval=0, max_interval=8)
+
+def test_static_scene_backs_off_and_forces_analysis():
+    gate = MotionGate(min_interval=1, max_interval=4, threshold=0.01, pixel_threshold=25, scale=0.5, backoff=2)
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    t, analyzed = 0, []
+    for _ in range(6):
+        analyzed.append(gate.check(frame, t))
+        t += gate.interval
+    # 间隔1→2→4后达到上限，之后每次检查都到了强制分析的时间
+    assert analyzed == [True, False, False, True, True, True]
+    assert gate.interval == 4
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from multicam import parse_camera_sources
+
+def test_parse_camera_sources():
+    sources = parse_camera_sources(['0:B1', 'rtsp://host:554/stream:b2', {'source': 1, 'layer': 'b3', 'name': 'b3_east'}])
+    assert sources == [('0', 'b1', 'b1'), ('rtsp://host:554/stream', 'b2', 'b2'), (1, 'b3', 'b3_east')]
+
+def test_parse_camera_sources_rejects_shared_layer():
+    with pytest.raises(ValueError):
+        parse_camera_sources(['0:b1', 'rtsp://host/stream:B1'])
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import cv2
+import numpy as np
+
+import pytest
+
+import metrics
+import process
+
+def reference_status(image, slot):
+    """逐个车位转换HSV并统计，作为批量统计的对照"""
+    x, y, w, h = slot
+    hsv = cv2.cvtColor(image[max(y, 0):y + h, max(x, 0):x + w], cv2.COLOR_BGR2HSV)
+    green = cv2.countNonZero(cv2.inRange(hsv, process.LOWER_GREEN, process.UPPER_GREEN))
+    red = (cv2.countNonZero(cv2.inRange(hsv, process.LOWER_RED1, process.UPPER_RED1)) +
+           cv2.countNonZero(cv2.inRange(hsv, process.LOWER_RED2, process.UPPER_RED2)))
+    return green > red, max(green, red) / max(1, green + red)
+
+def test_classify_slots_matches_per_slot_reference():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(200, 300, 3), dtype=np.uint8)
+    # 不同宽度、相互重叠和超出画面的车位
+    slots = [(0, 0, 50, 40), (30, 20, 80, 30), (250, 150, 80, 80), (100, 100, 1, 60), (120, 10, 0, 10)]
+    slots += [(int(x), int(y), int(w), int(h)) for x, y, w, h in rng.integers(1, 120, size=(30, 4))]
+
+    statuses = process.classify_slots(image, slots, scale=1.0)
+    expected = [reference_status(image, slot) if slot[2] > 0 else (False, 0.0) for slot in slots]
+    assert statuses == expected
+    assert process.check_slot_status(image, slots[1]) == expected[1]
+
+def test_process_frame_counts_failures():
+    def failed():
+        return sum(metrics.FRAMES_FAILED.snapshot().values())
+
+    before = failed()
+    with pytest.raises(cv2.error):
+        process.process_frame(np.zeros((0, 0, 3), dtype=np.uint8))
+    assert failed() == before + 1
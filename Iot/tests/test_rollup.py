@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import time
+
+import upload
+from config import UPLOAD_CONFIG
+from rollup import OccupancyRollup, LAYER_SLOT
+
+def test_rollup_splits_time_across_buckets():
+    rollup = OccupancyRollup(bucket_seconds=(300,), max_gap=120)
+    start = 1_700_000_100  # 5分钟边界之后100秒
+    for offset in range(0, 601, 60):
+        rollup.update(start + offset, [offset >= 300, False])
+    rollup.close_buckets()
+
+    layer_rows = [row for row in rollup.pop_rows() if row[2] == LAYER_SLOT]
+    assert sum(row[3] for row in layer_rows) == 600 * 2
+    assert sum(row[4] for row in layer_rows) == 300
+    assert sum(row[5] for row in layer_rows) == 1
+
+def test_video_rollup_uses_position_in_footage(tmp_path, monkeypatch):
+    monkeypatch.setitem(UPLOAD_CONFIG, 'rollups', True)
+    monkeypatch.setitem(UPLOAD_CONFIG, 'rollup_buckets', (300,))
+    monkeypatch.setitem(UPLOAD_CONFIG, 'delta_mode', False)
+    monkeypatch.setitem(UPLOAD_CONFIG, 'spool_path', str(tmp_path / 'spool.db'))
+    # 数据库不可用：记录写入本地缓存，汇总行保留在内存中
+    monkeypatch.setattr(upload.ParkingDatabase, '_try_connect', lambda self: False)
+    monkeypatch.setattr(upload.ParkingDatabase, '_ensure_connected', lambda self: False)
+
+    db = upload.ParkingDatabase('b1', buffered=False)
+    now = time.time()
+    # 一小时的录像在几秒内处理完，车位1在第30分钟驶离
+    for index, frame_time in enumerate(range(10, 3601, 10)):
+        free_positions = [2] if frame_time < 1800 else [1, 2]
+        db.upload_result(now + index * 0.01, 2, len(free_positions), free_positions, 'video', frame_time=frame_time)
+    db.flush_rollups(close=True)
+
+    layer_rows = [row for row in db._rollup_rows if row[2] == LAYER_SLOT]
+    assert len(layer_rows) >= 12
+    assert abs(sum(row[3] for row in layer_rows) - 3590 * 2) < 1e-6
+    assert abs(sum(row[4] for row in layer_rows) - 1790) < 1e-6
+    assert sum(row[6] for row in layer_rows) == 1
+
+    # 新的视频从头开始时重新计时，不与上一段视频的状态比较
+    db.upload_result(time.time(), 2, 0, [], 'video', frame_time=10)
+    assert sum(row[6] for row in db._rollup_rows if row[2] == LAYER_SLOT) == 1
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from slot_tracker import SlotStateTracker
+
+SLOTS = [(0, 0, 10, 10)]
+
+def run(tracker, observations):
+    """逐帧输入单个车位的观测，返回平滑后的状态序列"""
+    return [tracker.update(SLOTS, [(is_free, 1.0)])[0][0] for is_free in observations]
+
+@pytest.mark.parametrize('window, votes', [(5, 2), (5, 1), (3, 2), (4, 2)])
+def test_vote_state_stays_after_flip(window, votes):
+    tracker = SlotStateTracker(method='vote', window=window, votes=votes, min_confidence=0)
+    states = run(tracker, [True] * 4 + [False] * 8)
+
+    flip = states.index(False)
+    assert all(state is False for state in states[flip:])
+    assert tracker.transitions == 1
+
+def test_vote_suppresses_single_frame_flip():
+    tracker = SlotStateTracker(method='vote', window=3, votes=2, min_confidence=0)
+    assert run(tracker, [True, True, False, True, True]) == [True] * 5
+    assert tracker.suppressed == 1
+
+def test_explicit_zero_is_not_replaced_by_default():
+    tracker = SlotStateTracker(method='ema', min_confidence=0, free_threshold=0, occupied_threshold=0)
+    assert tracker.min_confidence == 0
+    with pytest.raises(ValueError):
+        SlotStateTracker(method='vote', window=3, votes=0)
+
+def test_history_survives_small_slot_jitter():
+    tracker = SlotStateTracker(method='vote', window=3, votes=2, min_confidence=0, match_distance=10)
+    slots = [(0, 0, 50, 80), (60, 0, 50, 80)]
+    jittered = [(61, 1, 49, 80), (1, 0, 50, 79)]  # 位置抖动且检测顺序不同
+
+    tracker.update(slots, [(True, 1.0), (False, 1.0)])
+    # 单帧翻转被平滑，历史按车位对应而不是按顺序对应
+    assert tracker.update(jittered, [(True, 1.0), (False, 1.0)]) == [(False, 1.0), (True, 1.0)]
+    assert tracker.suppressed == 2
+    assert tracker.update(slots, [(False, 1.0), (True, 1.0)]) == [(False, 1.0), (True, 1.0)]
+    assert tracker.transitions == 2
+
+def test_history_resets_when_layout_changes():
+    tracker = SlotStateTracker(method='vote', window=3, votes=2, min_confidence=0, match_distance=10)
+    tracker.update([(0, 0, 50, 80)], [(True, 1.0)])
+    assert tracker.update([(200, 0, 50, 80)], [(False, 1.0)]) == [(False, 1.0)]
+    assert tracker.update([(200, 0, 50, 80), (0, 0, 50, 80)], [(True, 1.0), (True, 1.0)]) == [(True, 1.0), (True, 1.0)]
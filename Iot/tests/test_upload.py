@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import mysql.connector
+import pytest
+
+import upload
+from config import UPLOAD_CONFIG
+
+class ExhaustedPool:
+    def __init__(self):
+        self.requests = 0
+
+    def get_connection(self):
+        self.requests += 1
+        raise mysql.connector.errors.PoolError("Failed getting connection; pool exhausted")
+
+def test_exhausted_pool_is_retried_max_retries_times(tmp_path, monkeypatch):
+    monkeypatch.setitem(UPLOAD_CONFIG, 'spool_path', str(tmp_path / 'spool.db'))
+    monkeypatch.setitem(UPLOAD_CONFIG, 'max_retries', 3)
+    pool = ExhaustedPool()
+    sleeps = []
+    monkeypatch.setattr(upload, 'get_connection_pool', lambda: pool)
+    monkeypatch.setattr(upload.time, 'sleep', sleeps.append)
+
+    db = upload.ParkingDatabase('b1')
+    assert not db.online
+    pool.requests = 0
+
+    with pytest.raises(mysql.connector.errors.PoolError):
+        db._with_retries(lambda connection, cursor: None)
+    assert pool.requests == 4
+    assert len(sleeps) == 3
+
+class FailingPool:
+    def get_connection(self):
+        raise mysql.connector.errors.InterfaceError("Can't connect to MySQL server")
+
+def test_close_without_spool_surfaces_unwritten_buffer(monkeypatch, capsys):
+    monkeypatch.setitem(UPLOAD_CONFIG, 'spool_path', None)
+    monkeypatch.setitem(UPLOAD_CONFIG, 'max_retries', 1)
+    monkeypatch.setattr(upload.ParkingDatabase, 'connect', lambda self: None)
+    monkeypatch.setattr(upload.ParkingDatabase, 'ensure_schema', lambda self: None)
+    monkeypatch.setattr(upload, 'get_connection_pool', lambda: FailingPool())
+    monkeypatch.setattr(upload.time, 'sleep', lambda seconds: None)
+
+    db = upload.ParkingDatabase('b1', buffered=True, delta_mode=False)
+    db.upload_result(1_700_000_000, 2, 1, [1], 'video')
+    db.online = False  # 上一次写入失败后处于离线状态
+
+    with pytest.raises(mysql.connector.errors.InterfaceError):
+        db.close()
+    assert "1 条记录" in capsys.readouterr().out
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import time
+
+from config import UPLOAD_CONFIG
+from uploader import AsyncUploader
+
+class SlowDatabase:
+    """每次写入耗时固定时间的数据库桩"""
+
+    def __init__(self, parking_layer, delay=0.005):
+        self.delay = delay
+        self.records = []
+
+    def upload_result(self, **record):
+        time.sleep(self.delay)
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+def submit_all(uploader, count):
+    for index in range(count):
+        uploader.submit(timestamp=index, total_slots=1, free_slots=0, free_positions=[], source_type='video')
+
+def test_offline_source_never_drops(monkeypatch):
+    monkeypatch.setitem(UPLOAD_CONFIG, 'async_policy', 'drop_oldest')
+    monkeypatch.setitem(UPLOAD_CONFIG, 'async_block_timeout', 0.001)
+    with AsyncUploader('b1', max_queue=2, db_factory=SlowDatabase, live=False) as uploader:
+        submit_all(uploader, 30)
+    stats = uploader.stats()
+    assert stats['uploaded'] == 30
+    assert stats['dropped'] == 0
+
+def test_live_source_drops_oldest():
+    with AsyncUploader('b1', max_queue=2, policy='drop_oldest', db_factory=SlowDatabase) as uploader:
+        submit_all(uploader, 30)
+    stats = uploader.stats()
+    assert stats['dropped'] > 0
+    assert stats['uploaded'] + stats['dropped'] == 30
@@ -2,86 +2,417 @@
 # -*- coding: utf-8 -*-
 
 import mysql.connector
+from mysql.connector import pooling
 import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from config import DB_CONFIG, PROCESS_CONFIG
+from spool import LocalSpool
+from slot_bitmap import encode_free_bitmap, diff_free_bitmaps
+from rollup import OccupancyRollup, occupied_from_bitmap
+
+try:
+    from config import UPLOAD_CONFIG
+except ImportError:
+    # 兼容未添加上传配置的旧配置文件
+    UPLOAD_CONFIG = {}
+
+# 连接类错误：数据库不可达、连接中断或连接池借空，会按退避间隔重试，重试用尽后写入本地缓存
+CONNECTION_ERRORS = (
+    mysql.connector.errors.InterfaceError,
+    mysql.connector.errors.OperationalError,
+    mysql.connector.errors.PoolError
+)
+
+# 数据表结构版本，每次修改表结构时递增，create_tables_if_not_exist负责迁移到该版本
+SCHEMA_VERSION = 5
+
+# 记录表结构版本的元数据表
+SCHEMA_META_TABLE = 'parking_schema_meta'
+
+# 各层最新状态快照表（每层一行，主键为层数），读取当前状态时按主键查询，不受历史记录数量影响
+LATEST_TABLE = 'parking_status_latest'
+
+# 快照表中与状态表一一对应的列
+LATEST_COLUMNS = ('timestamp', 'total_slots', 'free_slots', 'free_positions', 'parking_rows',
+                  'parking_columns', 'reservation', 'source_type', 'record_uid', 'free_bitmap')
+
+# 本进程中已确认为最新结构的数据表，避免重复检查
+_checked_tables = set()
+
+# 进程内共享的连接池
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """
+    获取进程内共享的数据库连接池，首次调用时创建
+    
+    同一进程中各层的ParkingDatabase共用该连接池，每次操作时借出一个连接、用完立即归还，
+    多个层的上传不需要各自持有连接。创建失败（数据库不可达）时下次调用会重新创建。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name='parking_pool',
+                pool_size=UPLOAD_CONFIG.get('pool_size', 4),
+                # 不使用会话变量，归还连接时无需重置会话（已断开的连接重置会失败）
+                pool_reset_session=False,
+                **DB_CONFIG
+            )
+        return _pool
 
 class ParkingDatabase:
-    def __init__(self):
-        self.connection = None
-        self.cursor = None
-        self.parking_layer = PROCESS_CONFIG['parking_layer']
-        self.connect()
-        self.create_tables_if_not_exist()
+    def __init__(self, parking_layer=None, buffered=None, delta_mode=None):
+        """
+        Args:
+            parking_layer: 停车场层数，默认使用配置中的层数
+            buffered: 是否启用缓冲写入，默认使用 UPLOAD_CONFIG['buffered']
+            delta_mode: 是否只在车位状态变化时写入，默认使用 UPLOAD_CONFIG['delta_mode']
+        """
+        self.parking_layer = parking_layer or PROCESS_CONFIG['parking_layer']
+        
+        # 缓冲写入：结果先进入缓冲区，达到数量或时间阈值后用一次事务批量插入
+        if buffered is None:
+            buffered = UPLOAD_CONFIG.get('buffered', False)
+        self.buffered = buffered
+        self.buffer_size = UPLOAD_CONFIG.get('buffer_size', 100)
+        self.flush_interval = UPLOAD_CONFIG.get('flush_interval', 5)
+        self._buffer = []
+        self._last_flush = time.time()
+        
+        # 变化写入：车位状态没有变化时跳过，只按心跳间隔写入一条记录
+        if delta_mode is None:
+            delta_mode = UPLOAD_CONFIG.get('delta_mode', False)
+        self.delta_mode = delta_mode
+        self.heartbeat_interval = UPLOAD_CONFIG.get('heartbeat_interval', 300)
+        self.record_events = UPLOAD_CONFIG.get('record_events', False)
+        self._last_state = None
+        self._last_sent_time = None
+        self.skipped = 0
+        
+        # 边缘汇总：按时间桶累计各车位的占用时长、驶入驶离次数和停留时长，时间桶结束时写入汇总表
+        self.rollup = None
+        if UPLOAD_CONFIG.get('rollups', False):
+            self.rollup = OccupancyRollup(
+                UPLOAD_CONFIG.get('rollup_buckets', (300, 3600)),
+                UPLOAD_CONFIG.get('rollup_max_gap', 120)
+            )
+        self.rollup_max_pending = UPLOAD_CONFIG.get('rollup_max_pending', 10000)
+        self._rollup_rows = []
+        # 视频来源的汇总按视频内时间计时：视频第一帧的时间戳减去其视频内时间作为起点
+        self._video_origin = None
+        self._last_frame_time = None
+        
+        # 本地缓存：数据库不可用时结果写入本地，连接恢复后按顺序回放
+        spool_path = UPLOAD_CONFIG.get('spool_path', 'cache/upload_spool.db')
+        self.spool = LocalSpool(spool_path) if spool_path else None
+        self.spool_batch_size = UPLOAD_CONFIG.get('spool_batch_size', 500)
+        self.reconnect_interval = UPLOAD_CONFIG.get('reconnect_interval', 30)
+        self._last_connect_attempt = 0
+        
+        # 连接类错误按指数退避重试的次数和间隔
+        self.max_retries = UPLOAD_CONFIG.get('max_retries', 3)
+        self.retry_backoff = UPLOAD_CONFIG.get('retry_backoff', 0.5)
+        self.retry_backoff_max = UPLOAD_CONFIG.get('retry_backoff_max', 8)
+        self.online = False
+        
+        if self.spool is None:
+            self.connect()
+            self.ensure_schema()
+        elif self._try_connect():
+            self.replay()
     
     def connect(self):
-        """连接到MySQL数据库"""
+        """从共享连接池借出一个连接，确认数据库可用"""
         try:
-            self.connection = mysql.connector.connect(**DB_CONFIG)
-            self.cursor = self.connection.cursor()
+            with self._session():
+                pass
+            self.online = True
             print("数据库连接成功")
             print("-"*50)  # 添加分隔线
         except mysql.connector.Error as err:
+            self.online = False
             print(f"数据库连接失败: {err}")
             raise
     
+    @contextmanager
+    def _session(self):
+        """
+        从连接池借出一个连接，退出时归还；发生异常时回滚未提交的事务
+        
+        连接池借出连接前会先检查连接是否存活（ping），已断开的连接会自动重连。
+        
+        Yields:
+            (connection, cursor)
+        """
+        # 连接池借空时直接抛出PoolError，由_with_retries统一按退避间隔重试
+        connection = get_connection_pool().get_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                yield connection, cursor
+            finally:
+                cursor.close()
+        except BaseException:
+            try:
+                connection.rollback()
+            except mysql.connector.Error:
+                pass
+            raise
+        finally:
+            # 对连接池中的连接调用close()是归还而不是关闭
+            connection.close()
+    
+    def _backoff(self, attempt):
+        """第attempt次重试前的等待秒数（指数退避，有上限）"""
+        return min(self.retry_backoff_max, self.retry_backoff * (2 ** attempt))
+    
+    def _with_retries(self, operation):
+        """
+        在借出的连接上执行数据库操作，连接类错误（包括连接池借空）时按指数退避重试有限次数
+        
+        这里是唯一的重试位置，总尝试次数为 max_retries + 1。
+        
+        Args:
+            operation: 接收(connection, cursor)的函数
+        
+        Returns:
+            operation的返回值
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._session() as (connection, cursor):
+                    result = operation(connection, cursor)
+                self.online = True
+                return result
+            except CONNECTION_ERRORS as err:
+                self.online = False
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"数据库连接异常: {err}，{delay:.1f}秒后重试 ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+    
+    def _try_connect(self):
+        """
+        尝试连接数据库并检查数据表，失败时进入离线模式而不抛出异常
+        
+        Returns:
+            是否连接成功
+        """
+        self._last_connect_attempt = time.time()
+        try:
+            self.connect()
+            self.ensure_schema()
+            return True
+        except mysql.connector.Error:
+            self.online = False
+            print(f"数据库暂不可用，结果将写入本地缓存: {self.spool.path}")
+            return False
+    
+    def _ensure_connected(self):
+        """离线时按reconnect_interval间隔尝试重新连接（未启用本地缓存时总是直接尝试写入）"""
+        if self.online or self.spool is None:
+            return True
+        if time.time() - self._last_connect_attempt < self.reconnect_interval:
+            return False
+        return self._try_connect()
+    
+    def ensure_schema(self):
+        """
+        确认当前层数据表为最新结构
+        
+        每个进程每张表只检查一次，且只读取元数据表中的版本号（主键查询），
+        不再每次启动都扫描information_schema。版本过旧时按 UPLOAD_CONFIG['auto_migrate']
+        自动迁移，或提示运行 main.py migrate。
+        """
+        table_name = f"parking_status_{self.parking_layer}"
+        if table_name in _checked_tables:
+            return
+        
+        if self.get_schema_version() >= SCHEMA_VERSION:
+            _checked_tables.add(table_name)
+            return
+        
+        if UPLOAD_CONFIG.get('auto_migrate', True):
+            self.create_tables_if_not_exist()
+        else:
+            print(f"数据表 {table_name} 的结构版本过旧，请先运行: python main.py migrate --layers {self.parking_layer}")
+    
+    def get_schema_version(self):
+        """
+        读取当前层数据表的结构版本
+        
+        Returns:
+            version: 结构版本号，元数据表或记录不存在时返回0
+        """
+        table_name = f"parking_status_{self.parking_layer}"
+        
+        def read_version(connection, cursor):
+            cursor.execute(
+                f"SELECT schema_version FROM {SCHEMA_META_TABLE} WHERE table_name = %s",
+                (table_name,)
+            )
+            return cursor.fetchone()
+        
+        try:
+            row = self._with_retries(read_version)
+        except mysql.connector.errors.ProgrammingError as err:
+            # 元数据表尚未创建
+            if err.errno == 1146:
+                return 0
+            raise
+        return row[0] if row else 0
+    
     def create_tables_if_not_exist(self):
-        """创建必要的数据表（如果不存在）"""
+        """创建必要的数据表（如果不存在），将已有数据表迁移到最新结构并记录版本号"""
         try:
-            # 创建不同层的停车记录表
-            table_name = f"parking_status_{self.parking_layer}"
-            
-            # 首先检查表是否存在
-            self.cursor.execute(f"""
-                SELECT COUNT(*)
-                FROM information_schema.tables
-                WHERE table_schema = '{DB_CONFIG['database']}'
-                AND table_name = '{table_name}'
-            """)
-            table_exists = self.cursor.fetchone()[0] > 0
-            
-            if table_exists:
-                # 检查是否有parking_rows和parking_columns列
-                self.cursor.execute(f"""
-                    SELECT COUNT(*)
-                    FROM information_schema.columns
-                    WHERE table_schema = '{DB_CONFIG['database']}'
-                    AND table_name = '{table_name}'
-                    AND column_name = 'parking_rows'
-                """)
-                has_parking_rows = self.cursor.fetchone()[0] > 0
+            with self._session() as (connection, cursor):
+                # 创建不同层的停车记录表
+                table_name = f"parking_status_{self.parking_layer}"
                 
-                # 检查是否有reservation列
-                self.cursor.execute(f"""
+                # 首先检查表是否存在
+                cursor.execute(f"""
                     SELECT COUNT(*)
-                    FROM information_schema.columns
+                    FROM information_schema.tables
                     WHERE table_schema = '{DB_CONFIG['database']}'
                     AND table_name = '{table_name}'
-                    AND column_name = 'reservation'
                 """)
-                has_reservation = self.cursor.fetchone()[0] > 0
+                table_exists = cursor.fetchone()[0] > 0
                 
-                if not has_parking_rows:
-                    # 添加缺少的列
-                    print(f"正在更新表 {table_name} 的结构...")
-                    self.cursor.execute(f"""
-                        ALTER TABLE {table_name}
-                        ADD COLUMN parking_rows INT NULL,
-                        ADD COLUMN parking_columns INT NULL
+                if table_exists:
+                    # 检查是否有parking_rows和parking_columns列
+                    cursor.execute(f"""
+                        SELECT COUNT(*)
+                        FROM information_schema.columns
+                        WHERE table_schema = '{DB_CONFIG['database']}'
+                        AND table_name = '{table_name}'
+                        AND column_name = 'parking_rows'
                     """)
-                
-                if not has_reservation:
-                    # 添加reservation列
-                    print(f"正在为表 {table_name} 添加reservation字段...")
-                    self.cursor.execute(f"""
-                        ALTER TABLE {table_name}
-                        ADD COLUMN reservation JSON NULL
+                    has_parking_rows = cursor.fetchone()[0] > 0
+                    
+                    # 检查是否有reservation列
+                    cursor.execute(f"""
+                        SELECT COUNT(*)
+                        FROM information_schema.columns
+                        WHERE table_schema = '{DB_CONFIG['database']}'
+                        AND table_name = '{table_name}'
+                        AND column_name = 'reservation'
+                    """)
+                    has_reservation = cursor.fetchone()[0] > 0
+                    
+                    # 检查是否有record_uid列
+                    cursor.execute(f"""
+                        SELECT COUNT(*)
+                        FROM information_schema.columns
+                        WHERE table_schema = '{DB_CONFIG['database']}'
+                        AND table_name = '{table_name}'
+                        AND column_name = 'record_uid'
+                    """)
+                    has_record_uid = cursor.fetchone()[0] > 0
+                    
+                    # 检查是否有free_bitmap列
+                    cursor.execute(f"""
+                        SELECT COUNT(*)
+                        FROM information_schema.columns
+                        WHERE table_schema = '{DB_CONFIG['database']}'
+                        AND table_name = '{table_name}'
+                        AND column_name = 'free_bitmap'
                     """)
-            else:
-                # 创建新表
-                self.cursor.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {table_name} (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
+                    has_free_bitmap = cursor.fetchone()[0] > 0
+                    
+                    if not has_parking_rows:
+                        # 添加缺少的列
+                        print(f"正在更新表 {table_name} 的结构...")
+                        cursor.execute(f"""
+                            ALTER TABLE {table_name}
+                            ADD COLUMN parking_rows INT NULL,
+                            ADD COLUMN parking_columns INT NULL
+                        """)
+                    
+                    if not has_reservation:
+                        # 添加reservation列
+                        print(f"正在为表 {table_name} 添加reservation字段...")
+                        cursor.execute(f"""
+                            ALTER TABLE {table_name}
+                            ADD COLUMN reservation JSON NULL
+                        """)
+                    
+                    if not has_record_uid:
+                        # 添加record_uid列，用于本地缓存回放时去重
+                        print(f"正在为表 {table_name} 添加record_uid字段...")
+                        cursor.execute(f"""
+                            ALTER TABLE {table_name}
+                            ADD COLUMN record_uid VARCHAR(32) NULL,
+                            ADD UNIQUE KEY uk_record_uid (record_uid)
+                        """)
+                    
+                    if not has_free_bitmap:
+                        # 添加free_bitmap列，每个车位1位的空闲车位位图
+                        print(f"正在为表 {table_name} 添加free_bitmap字段...")
+                        cursor.execute(f"""
+                            ALTER TABLE {table_name}
+                            ADD COLUMN free_bitmap VARBINARY(255) NULL
+                        """)
+                else:
+                    # 创建新表
+                    cursor.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {table_name} (
+                            id INT AUTO_INCREMENT PRIMARY KEY,
+                            timestamp DATETIME NOT NULL,
+                            total_slots INT NOT NULL,
+                            free_slots INT NOT NULL,
+                            free_positions JSON,
+                            parking_rows INT,
+                            parking_columns INT,
+                            reservation JSON NULL,
+                            source_type ENUM('image', 'video', 'camera') NOT NULL,
+                            record_uid VARCHAR(32) NULL,
+                            free_bitmap VARBINARY(255) NULL,
+                            UNIQUE KEY uk_record_uid (record_uid)
+                        )
+                    """)
+                
+                # 车位状态变化事件表（每次车位空闲/占用切换一行）
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS parking_events_{self.parking_layer} (
+                        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        timestamp DATETIME NOT NULL,
+                        slot_number INT NOT NULL,
+                        is_free TINYINT(1) NOT NULL,
+                        record_uid VARCHAR(32) NOT NULL,
+                        UNIQUE KEY uk_record_slot (record_uid, slot_number),
+                        KEY idx_slot_time (slot_number, timestamp)
+                    )
+                """)
+                
+                # 按时间桶汇总的车位占用统计表，同一时间桶的多次写入（程序重启）累加
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS parking_rollup_{self.parking_layer} (
+                        bucket_start DATETIME NOT NULL,
+                        bucket_seconds INT NOT NULL,
+                        slot_number INT NOT NULL,
+                        observed_seconds DOUBLE NOT NULL,
+                        occupied_seconds DOUBLE NOT NULL,
+                        occupancy_ratio DOUBLE NULL,
+                        arrivals INT NOT NULL,
+                        departures INT NOT NULL,
+                        dwell_count INT NOT NULL,
+                        dwell_seconds DOUBLE NOT NULL,
+                        PRIMARY KEY (bucket_seconds, bucket_start, slot_number)
+                    )
+                """)
+                
+                # 最新状态快照表，并用当前最新一条记录初始化本层的快照
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {LATEST_TABLE} (
+                        parking_layer VARCHAR(16) PRIMARY KEY,
+                        status_id INT NOT NULL,
                         timestamp DATETIME NOT NULL,
                         total_slots INT NOT NULL,
                         free_slots INT NOT NULL,
@@ -89,18 +420,47 @@ class ParkingDatabase:
                         parking_rows INT,
                         parking_columns INT,
                         reservation JSON NULL,
-                        source_type ENUM('image', 'video', 'camera') NOT NULL
+                        source_type ENUM('image', 'video', 'camera') NOT NULL,
+                        record_uid VARCHAR(32) NULL,
+                        free_bitmap VARBINARY(255) NULL
                     )
                 """)
-            
-            self.connection.commit()
-            print(f"数据表检查/创建/更新完成，当前使用停车场层数: {self.parking_layer}, 表名: {table_name}")
-            print("-"*50)  # 添加分隔线
+                # 结构版本3创建的快照表没有free_bitmap列
+                cursor.execute(f"""
+                    SELECT COUNT(*)
+                    FROM information_schema.columns
+                    WHERE table_schema = '{DB_CONFIG['database']}'
+                    AND table_name = '{LATEST_TABLE}'
+                    AND column_name = 'free_bitmap'
+                """)
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"ALTER TABLE {LATEST_TABLE} ADD COLUMN free_bitmap VARBINARY(255) NULL")
+                cursor.execute(self._latest_query("ORDER BY id DESC LIMIT 1"), (self.parking_layer,))
+                
+                # 记录结构版本，之后启动时只需读取版本号
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {SCHEMA_META_TABLE} (
+                        table_name VARCHAR(64) PRIMARY KEY,
+                        schema_version INT NOT NULL,
+                        updated_at DATETIME NOT NULL
+                    )
+                """)
+                cursor.execute(f"""
+                    INSERT INTO {SCHEMA_META_TABLE} (table_name, schema_version, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON DUPLICATE KEY UPDATE schema_version = VALUES(schema_version), updated_at = VALUES(updated_at)
+                """, (table_name, SCHEMA_VERSION))
+                
+                connection.commit()
+                _checked_tables.add(table_name)
+                print(f"数据表检查/创建/更新完成，当前使用停车场层数: {self.parking_layer}, 表名: {table_name}")
+                print("-"*50)  # 添加分隔线
         except mysql.connector.Error as err:
             print(f"创建/更新数据表失败: {err}")
             raise
     
-    def upload_result(self, timestamp, total_slots, free_slots, free_positions, source_type, parking_rows=None, parking_columns=None):
+    def upload_result(self, timestamp, total_slots, free_slots, free_positions, source_type, parking_rows=None, parking_columns=None,
+                      frame_time=None):
         """
         上传停车场分析结果到数据库
         
@@ -112,54 +472,371 @@ class ParkingDatabase:
             source_type: 数据来源类型 ('image', 'video', 'camera')
             parking_rows: 停车场行数
             parking_columns: 停车场列数
+            frame_time: 该帧在视频中的时间（秒），视频来源时传入，汇总按视频内时间而不是处理时间计时
         
         Returns:
-            record_id: 插入记录的ID
+            record_id: 插入记录的ID，缓冲模式、写入本地缓存或因状态未变化而跳过时返回None
         """
+        # 如果传入的是时间戳而不是datetime对象，转换为datetime
+        if isinstance(timestamp, (int, float)):
+            dt = datetime.fromtimestamp(timestamp)
+        else:
+            dt = timestamp
+        
+        # 空闲车位位图，与JSON列表一起写入
+        free_bitmap = encode_free_bitmap(free_positions, total_slots)
+        
+        # 每一帧都计入汇总（包括变化写入模式下跳过的帧）
+        if self.rollup is not None:
+            self.rollup.update(self._rollup_time(dt, frame_time), occupied_from_bitmap(free_bitmap, total_slots))
+            self.flush_rollups()
+        
+        # 变化写入模式：状态未变化且未到心跳时间时跳过
+        events = []
+        if self.delta_mode:
+            events = self._detect_changes(dt, free_bitmap, total_slots, parking_rows, parking_columns)
+            if events is None:
+                self.skipped += 1
+                return None
+        
+        # 将列表转换为JSON字符串
+        positions_json = json.dumps(free_positions)
+        
+        # 每条记录带唯一ID，回放本地缓存时数据库按该ID去重
+        values = (dt, total_slots, free_slots, positions_json, source_type, parking_rows, parking_columns, uuid.uuid4().hex, free_bitmap)
+        record = (values, events)
+        
+        if self.buffered:
+            # 缓冲模式：达到数量或时间阈值时批量写入
+            self._buffer.append(record)
+            if len(self._buffer) >= self.buffer_size or time.time() - self._last_flush >= self.flush_interval:
+                self.flush()
+            return None
+        
+        # 离线时直接写入本地缓存
+        if not self._ensure_connected():
+            self._spool_records([record])
+            return None
+        
+        # 先回放更早的缓存记录，保证数据库中的记录按时间顺序排列
+        if not self.replay():
+            self._spool_records([record])
+            return None
+        
         try:
-            # 如果传入的是时间戳而不是datetime对象，转换为datetime
-            if isinstance(timestamp, (int, float)):
-                dt = datetime.fromtimestamp(timestamp)
-            else:
-                dt = timestamp
-            
-            # 将列表转换为JSON字符串
-            positions_json = json.dumps(free_positions)
-            
             # 使用对应层数的表
             table_name = f"parking_status_{self.parking_layer}"
             
-            # 插入记录到对应层的表
-            query = f"""
-                INSERT INTO {table_name} 
-                (timestamp, total_slots, free_slots, free_positions, source_type, parking_rows, parking_columns)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            values = (dt, total_slots, free_slots, positions_json, source_type, parking_rows, parking_columns)
-            
-            self.cursor.execute(query, values)
-            
-            # 获取插入的ID
-            record_id = self.cursor.lastrowid
-            
-            self.connection.commit()
+            # 插入记录到对应层的表，并获取插入的ID
+            record_id = self._with_retries(lambda connection, cursor: self._write_records(connection, cursor, [record]))
             
             print(f"记录已上传到数据库表 {table_name}，ID: {record_id}")
             
             return record_id
         
+        except CONNECTION_ERRORS as err:
+            print(f"上传记录失败: {err}")
+            if self.spool is None:
+                raise
+            self._last_connect_attempt = time.time()
+            self._spool_records([record])
+            return None
+        
         except mysql.connector.Error as err:
+            # 事务已在归还连接前回滚
             print(f"上传记录失败: {err}")
-            self.connection.rollback()
             raise
     
+    def _detect_changes(self, dt, free_bitmap, total_slots, parking_rows, parking_columns):
+        """
+        变化写入模式下比较本次结果与上次写入的结果
+        
+        Args:
+            free_bitmap: 本次结果的空闲车位位图
+        
+        Returns:
+            events: 需要写入时返回车位变化事件列表[(slot_number, is_free), ...]（心跳或布局变化时可能为空），
+                    状态未变化且未到心跳时间时返回None
+        """
+        state = (free_bitmap, total_slots, parking_rows, parking_columns)
+        now = dt.timestamp()
+        
+        previous = self._last_state
+        if state == previous and now - self._last_sent_time < self.heartbeat_interval:
+            return None
+        
+        events = []
+        # 布局相同时才能逐车位比较；首次写入或布局变化时没有可比较的基准
+        if self.record_events and previous is not None and previous[1:] == state[1:]:
+            events = diff_free_bitmaps(previous[0], free_bitmap)
+        
+        self._last_state = state
+        self._last_sent_time = now
+        return events
+    
+    def flush(self):
+        """
+        将缓冲区中的记录用一次多行插入写入数据库
+        
+        Returns:
+            written: 写入数据库的记录数（离线时写入本地缓存，返回0）
+        """
+        self._last_flush = time.time()
+        if not self._buffer:
+            return 0
+        
+        records = self._buffer
+        
+        # 离线或回放失败时，整个缓冲区写入本地缓存
+        if not self._ensure_connected() or not self.replay():
+            self._spool_records(records)
+            self._buffer = []
+            return 0
+        
+        table_name = f"parking_status_{self.parking_layer}"
+        try:
+            self._with_retries(lambda connection, cursor: self._write_records(connection, cursor, records))
+        except CONNECTION_ERRORS as err:
+            print(f"批量上传记录失败: {err}")
+            if self.spool is None:
+                raise
+            self._last_connect_attempt = time.time()
+            self._spool_records(records)
+            self._buffer = []
+            return 0
+        except mysql.connector.Error as err:
+            print(f"批量上传记录失败: {err}")
+            raise
+        
+        self._buffer = []
+        print(f"已批量上传 {len(records)} 条记录到数据库表 {table_name}")
+        return len(records)
+    
+    def replay(self):
+        """
+        将本地缓存中的记录按写入顺序分批回放到数据库
+        
+        Returns:
+            是否已全部回放（未启用缓存或缓存为空时返回True，回放中连接中断时返回False）
+        """
+        if self.spool is None:
+            return True
+        
+        table_name = f"parking_status_{self.parking_layer}"
+        replayed = 0
+        while True:
+            entries = self.spool.peek(self.parking_layer, self.spool_batch_size)
+            if not entries:
+                break
+            
+            records = []
+            for _, row in entries:
+                # 较早版本写入的缓存记录没有事件和位图，位图按JSON列表重新编码
+                events = [tuple(event) for event in row[8]] if len(row) > 8 else []
+                if len(row) > 9:
+                    free_bitmap = bytes.fromhex(row[9])
+                else:
+                    free_bitmap = encode_free_bitmap(json.loads(row[3]), row[1])
+                values = (datetime.fromisoformat(row[0]),) + tuple(row[1:8]) + (free_bitmap,)
+                records.append((values, events))
+            
+            try:
+                self._with_retries(lambda connection, cursor: self._write_records(connection, cursor, records))
+            except CONNECTION_ERRORS as err:
+                print(f"回放本地缓存失败: {err}")
+                self._last_connect_attempt = time.time()
+                return False
+            
+            # 提交成功后再删除；若在两步之间中断，重复回放会被record_uid去重
+            self.spool.remove([spool_id for spool_id, _ in entries])
+            replayed += len(entries)
+        
+        if replayed:
+            print(f"已从本地缓存回放 {replayed} 条记录到数据库表 {table_name}")
+        return True
+    
+    def _rollup_time(self, dt, frame_time):
+        """
+        汇总使用的时间戳
+        
+        视频的处理速度与实际时间无关，按处理时间计时会把一小时的录像压缩到一两个时间桶中。
+        视频来源按 起点 + 视频内时间 计时，起点为该视频第一帧的时间戳减去其视频内时间；
+        视频内时间没有递增时视为开始了新的视频，结束之前的时间桶并重新确定起点。
+        """
+        if frame_time is None:
+            self._video_origin = self._last_frame_time = None
+            return dt.timestamp()
+        if self._video_origin is None or frame_time <= self._last_frame_time:
+            if self._video_origin is not None:
+                self.rollup.restart()
+            self._video_origin = dt.timestamp() - frame_time
+        self._last_frame_time = frame_time
+        return self._video_origin + frame_time
+    
+    def flush_rollups(self, close=False):
+        """
+        写入已结束时间桶的汇总行
+        
+        数据库不可用时汇总行暂存在内存中，下次写入时一起提交，超过rollup_max_pending时丢弃最旧的行。
+        
+        Args:
+            close: 是否同时结束当前未结束的时间桶（程序退出时）
+        
+        Returns:
+            written: 写入数据库的汇总行数
+        """
+        if self.rollup is None:
+            return 0
+        if close:
+            self.rollup.close_buckets()
+        self._rollup_rows.extend(self.rollup.pop_rows())
+        if len(self._rollup_rows) > self.rollup_max_pending:
+            dropped = len(self._rollup_rows) - self.rollup_max_pending
+            del self._rollup_rows[:dropped]
+            print(f"数据库不可用，丢弃了 {dropped} 条最旧的汇总行")
+        if not self._rollup_rows or not self._ensure_connected():
+            return 0
+        
+        rows = self._rollup_rows
+        try:
+            self._with_retries(lambda connection, cursor: self._write_rollups(connection, cursor, rows))
+        except CONNECTION_ERRORS as err:
+            print(f"写入汇总行失败: {err}")
+            self._last_connect_attempt = time.time()
+            return 0
+        
+        self._rollup_rows = []
+        print(f"已写入 {len(rows)} 条汇总行到数据库表 parking_rollup_{self.parking_layer}")
+        return len(rows)
+    
+    def _write_rollups(self, connection, cursor, rows):
+        """在一个事务中写入汇总行，同一时间桶已有的行累加（占用率按累加后的时长重新计算）"""
+        cursor.executemany(f"""
+            INSERT INTO parking_rollup_{self.parking_layer}
+            (bucket_start, bucket_seconds, slot_number, observed_seconds, occupied_seconds, occupancy_ratio,
+             arrivals, departures, dwell_count, dwell_seconds)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                observed_seconds = observed_seconds + VALUES(observed_seconds),
+                occupied_seconds = occupied_seconds + VALUES(occupied_seconds),
+                occupancy_ratio = occupied_seconds / NULLIF(observed_seconds, 0),
+                arrivals = arrivals + VALUES(arrivals),
+                departures = departures + VALUES(departures),
+                dwell_count = dwell_count + VALUES(dwell_count),
+                dwell_seconds = dwell_seconds + VALUES(dwell_seconds)
+        """, [
+            (start, seconds, slot_number, observed, occupied, occupied / observed if observed else None,
+             arrivals, departures, dwell_count, dwell_seconds)
+            for start, seconds, slot_number, observed, occupied, arrivals, departures, dwell_count, dwell_seconds in rows
+        ])
+        connection.commit()
+    
+    def _write_records(self, connection, cursor, records):
+        """
+        在一个事务中写入记录及其车位变化事件
+        
+        Args:
+            connection: 从连接池借出的连接
+            cursor: 该连接的游标
+            records: [(values, events), ...]
+        
+        Returns:
+            record_id: 只写入一条记录时返回其ID，否则返回None
+        """
+        rows = [values for values, _ in records]
+        if len(rows) == 1:
+            cursor.execute(self._insert_query(), rows[0])
+            record_id = cursor.lastrowid
+        else:
+            # executemany会把INSERT改写为一条多行VALUES语句
+            cursor.executemany(self._insert_query(), rows)
+            record_id = None
+        
+        # 同一事务中把本层快照更新为本批最后一条记录
+        cursor.execute(self._latest_query("WHERE record_uid = %s"), (self.parking_layer, rows[-1][7]))
+        
+        # 事件与记录共用时间戳和record_uid
+        event_rows = [
+            (values[0], slot_number, int(is_free), values[7])
+            for values, events in records
+            for slot_number, is_free in events
+        ]
+        if event_rows:
+            cursor.executemany(f"""
+                INSERT INTO parking_events_{self.parking_layer}
+                (timestamp, slot_number, is_free, record_uid)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE record_uid = record_uid
+            """, event_rows)
+        
+        connection.commit()
+        return record_id
+    
+    def _spool_records(self, records):
+        """将记录写入本地缓存"""
+        if self.spool is None:
+            raise mysql.connector.errors.InterfaceError("数据库未连接")
+        self.spool.append(self.parking_layer, [
+            [values[0].isoformat(sep=' ')] + list(values[1:8]) + [events, values[8].hex()]
+            for values, events in records
+        ])
+        print(f"数据库不可用，{len(records)} 条记录已写入本地缓存（待回放: {self.spool.count(self.parking_layer)}）")
+    
+    def _insert_query(self):
+        """生成当前层数据表的插入语句（record_uid重复时忽略，保证回放幂等）"""
+        table_name = f"parking_status_{self.parking_layer}"
+        return f"""
+            INSERT INTO {table_name} 
+            (timestamp, total_slots, free_slots, free_positions, source_type, parking_rows, parking_columns, record_uid, free_bitmap)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE record_uid = record_uid
+        """
+    
+    def _latest_query(self, condition):
+        """
+        生成从当前层数据表更新最新状态快照的语句
+        
+        快照内容直接从状态表中按condition选出的记录复制，只有记录ID大于快照中的ID时才覆盖，
+        因此回放较早的缓存记录（或被record_uid去重的重复记录）不会让快照回退。
+        
+        Args:
+            condition: 选出状态记录的WHERE/ORDER BY子句，其中占位符的参数由调用方接在层数之后传入
+        """
+        table_name = f"parking_status_{self.parking_layer}"
+        columns = ', '.join(LATEST_COLUMNS)
+        # 多表INSERT ... SELECT中同名列需要带表名，status_id放在最后更新，前面的比较使用旧值
+        newer = f"VALUES(status_id) > {LATEST_TABLE}.status_id"
+        updates = ',\n                '.join(
+            f"{LATEST_TABLE}.{column} = IF({newer}, VALUES({column}), {LATEST_TABLE}.{column})"
+            for column in LATEST_COLUMNS
+        )
+        return f"""
+            INSERT INTO {LATEST_TABLE} (parking_layer, status_id, {columns})
+            SELECT %s, id, {columns} FROM {table_name} {condition}
+            ON DUPLICATE KEY UPDATE
+                {updates},
+                {LATEST_TABLE}.status_id = GREATEST({LATEST_TABLE}.status_id, VALUES(status_id))
+        """
+    
     def close(self):
-        """关闭数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
-            print("数据库连接已关闭")
+        """
+        写入缓冲区中剩余的记录和汇总行并关闭本地缓存（连接由共享连接池管理，无需关闭）
+        
+        即使上一次写入失败也会再尝试写入缓冲区；未启用本地缓存且仍然写入失败时抛出异常，不会静默丢弃记录。
+        """
+        try:
+            try:
+                self.flush()
+            except mysql.connector.Error:
+                print(f"关闭时未能写入数据库，丢弃缓冲区中的 {len(self._buffer)} 条记录")
+                raise
+            finally:
+                self.flush_rollups(close=True)
+                if self._rollup_rows:
+                    print(f"关闭时未能写入数据库，丢弃 {len(self._rollup_rows)} 条汇总行")
+        finally:
+            if self.spool:
+                self.spool.close()
     
     def __enter__(self):
         return self
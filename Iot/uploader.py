@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+import metrics
+from upload import ParkingDatabase, UPLOAD_CONFIG
+from config import PROCESS_CONFIG
+
+# 通知上传线程退出的哨兵
+_STOP = object()
+
+class AsyncUploader:
+    """
+    后台上传线程
+
+    检测循环只把结果放入有界队列，由后台线程写入数据库，数据库变慢或不可达时不会阻塞画面采集。
+    队列满时支持两种策略：
+        'drop_oldest': 丢弃队列中最旧的一条结果，保证采集循环永不等待
+        'block': 采集循环等待队列出现空位（背压），超过block_timeout秒仍未入队则丢弃新结果
+    丢弃结果只适用于实时摄像头（需要保证按时采集）。视频文件的解码速度可能远快于数据库写入，
+    离线来源（live=False）总是等待队列空位，不丢弃任何结果。
+    """
+
+    def __init__(self, parking_layer=None, max_queue=None, policy=None, block_timeout=None, db_factory=ParkingDatabase,
+                 live=True):
+        """
+        Args:
+            parking_layer: 默认停车场层数，submit时可按条覆盖
+            max_queue: 队列最大长度，默认取 UPLOAD_CONFIG['async_queue_size']
+            policy: 队列满时的策略，'drop_oldest' 或 'block'
+            block_timeout: 'block'策略下的最长等待秒数，None表示一直等待
+            db_factory: 创建数据库连接的函数，参数为停车场层数
+            live: 是否为实时来源，为False时忽略policy和block_timeout，队列满时一直等待
+        """
+        self.parking_layer = parking_layer or PROCESS_CONFIG['parking_layer']
+        if max_queue is None:
+            max_queue = UPLOAD_CONFIG.get('async_queue_size', 100)
+        if not live:
+            policy, block_timeout = 'block', None
+        else:
+            if policy is None:
+                policy = UPLOAD_CONFIG.get('async_policy', 'drop_oldest')
+            if block_timeout is None:
+                block_timeout = UPLOAD_CONFIG.get('async_block_timeout')
+        if policy not in ('drop_oldest', 'block'):
+            raise ValueError(f"未知的上传队列策略: {policy}")
+
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.db_factory = db_factory
+        self.retry_delay = UPLOAD_CONFIG.get('async_retry_delay', 5)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._databases = {}
+        self._thread = threading.Thread(target=self._run, name="parking-uploader", daemon=True)
+
+        # 队列指标
+        self.submitted = 0
+        self.uploaded = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+
+        metrics.UPLOAD_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._thread.start()
+
+    def submit(self, parking_layer=None, **record):
+        """
+        提交一条分析结果，参数与 ParkingDatabase.upload_result 相同
+
+        Args:
+            parking_layer: 该结果所属的停车场层数，默认使用上传器的层数
+
+        Returns:
+            accepted: 结果是否进入了队列
+        """
+        item = (parking_layer or self.parking_layer, record)
+
+        if self.policy == 'drop_oldest':
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    # 丢弃最旧的一条，为新结果腾出空间
+                    try:
+                        self._queue.get_nowait()
+                        self._queue.task_done()
+                        self._count('dropped')
+                        metrics.UPLOADS.inc(result='dropped')
+                    except queue.Empty:
+                        pass
+        else:
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._count('dropped')
+                metrics.UPLOADS.inc(result='dropped')
+                return False
+
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def queue_depth(self):
+        """当前等待上传的结果数"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        获取上传队列指标
+
+        Returns:
+            包含队列深度、提交/上传/丢弃/失败计数的字典
+        """
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'uploaded': self.uploaded,
+                'dropped': self.dropped,
+                'failed': self.failed
+            }
+
+    def close(self, timeout=None):
+        """等待队列中剩余结果上传完成，然后停止上传线程"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _get_database(self, parking_layer):
+        """在上传线程中按层创建并复用数据库连接"""
+        db = self._databases.get(parking_layer)
+        if db is None:
+            db = self.db_factory(parking_layer)
+            self._databases[parking_layer] = db
+        return db
+
+    def _run(self):
+        """上传线程主循环"""
+        try:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is _STOP:
+                        break
+                    parking_layer, record = item
+                    try:
+                        with metrics.stage_timer('upload'):
+                            self._get_database(parking_layer).upload_result(**record)
+                        self._count('uploaded')
+                        metrics.UPLOADS.inc(result='ok')
+                    except Exception as e:
+                        print(f"后台上传失败: {e}")
+                        self._count('failed')
+                        metrics.UPLOADS.inc(result='failed')
+                        # 连接失效时丢弃该层连接，稍后重建，避免失败时空转
+                        db = self._databases.pop(parking_layer, None)
+                        if db is not None:
+                            try:
+                                db.close()
+                            except Exception:
+                                pass
+                        time.sleep(self.retry_delay)
+                finally:
+                    self._queue.task_done()
+        finally:
+            for db in self._databases.values():
+                try:
+                    db.close()
+                except Exception as e:
+                    print(f"关闭数据库连接失败: {e}")
+            self._databases.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,38 @@
+<?php
+// 空闲车位位图：第n号车位对应第(n-1)/8个字节的第(n-1)%8位（低位在前），1为空闲
+// 与IoT端 slot_bitmap.py 的编码一致
+
+/**
+ * 把空闲车位列表编码为位图
+ *
+ * @param array $freePositions 空闲车位号列表（从1开始）
+ * @param int $totalSlots 总车位数
+ * @return string 长度为ceil(总车位数/8)的二进制字符串
+ */
+function encodeFreeBitmap($freePositions, $totalSlots) {
+    $bytes = array_fill(0, intdiv($totalSlots + 7, 8), 0);
+    foreach ($freePositions as $position) {
+        $index = intval($position) - 1;
+        if ($index >= 0 && $index < $totalSlots) {
+            $bytes[intdiv($index, 8)] |= 1 << ($index % 8);
+        }
+    }
+    return $bytes ? pack('C*', ...$bytes) : '';
+}
+
+/**
+ * 查询位图中某个车位是否空闲
+ *
+ * @param string $bitmap 位图
+ * @param int $slotNumber 车位号（从1开始）
+ * @return bool
+ */
+function isSlotFreeInBitmap($bitmap, $slotNumber) {
+    $index = intval($slotNumber) - 1;
+    $byteIndex = intdiv($index, 8);
+    if ($index < 0 || $byteIndex >= strlen($bitmap)) {
+        return false;
+    }
+    return ((ord($bitmap[$byteIndex]) >> ($index % 8)) & 1) === 1;
+}
+?>
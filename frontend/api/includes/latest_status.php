@@ -0,0 +1,76 @@
+<?php
+// 最新状态快照表：每层一行，由IoT端和预约接口在写入状态记录的同一事务中更新
+define('LATEST_STATUS_TABLE', 'parking_status_latest');
+
+/**
+ * 检查快照表是否存在（数据表尚未迁移到新结构时不存在）
+ */
+function latestStatusTableExists($pdo) {
+    static $exists = null;
+    if ($exists === null) {
+        $stmt = $pdo->query("SHOW TABLES LIKE '" . LATEST_STATUS_TABLE . "'");
+        $exists = $stmt->rowCount() > 0;
+    }
+    return $exists;
+}
+
+/**
+ * 获取某层最新的停车状态记录
+ *
+ * 优先按主键读取快照表；快照表不存在或没有该层的快照时，回退为查询状态表的最新一条记录。
+ *
+ * @param PDO $pdo 数据库连接
+ * @param string $tableName 状态表名，例如 parking_status_b1
+ * @return array|false 最新记录，没有记录时返回false
+ */
+function fetchLatestStatus($pdo, $tableName) {
+    $layer = substr($tableName, strlen('parking_status_'));
+
+    if (latestStatusTableExists($pdo)) {
+        $stmt = $pdo->prepare("SELECT * FROM " . LATEST_STATUS_TABLE . " WHERE parking_layer = :layer");
+        $stmt->execute([':layer' => $layer]);
+        $status = $stmt->fetch(PDO::FETCH_ASSOC);
+        if ($status) {
+            return $status;
+        }
+    }
+
+    $stmt = $pdo->prepare("SELECT * FROM $tableName ORDER BY id DESC LIMIT 1");
+    $stmt->execute();
+    return $stmt->fetch(PDO::FETCH_ASSOC);
+}
+
+/**
+ * 将某层的快照更新为状态表中指定ID的记录，需要在插入该记录的事务中调用
+ *
+ * @param PDO $pdo 数据库连接
+ * @param string $tableName 状态表名，例如 parking_status_b1
+ * @param int $statusId 刚插入的状态记录ID
+ */
+function updateLatestStatus($pdo, $tableName, $statusId) {
+    if (!latestStatusTableExists($pdo)) {
+        return;
+    }
+
+    $layer = substr($tableName, strlen('parking_status_'));
+    $latest = LATEST_STATUS_TABLE;
+    $columns = ['timestamp', 'total_slots', 'free_slots', 'free_positions', 'parking_rows',
+                'parking_columns', 'reservation', 'source_type', 'record_uid', 'free_bitmap'];
+
+    // 只有记录ID更新时才覆盖快照，status_id放在最后更新
+    $updates = [];
+    foreach ($columns as $column) {
+        $updates[] = "$latest.$column = IF(VALUES(status_id) > $latest.status_id, VALUES($column), $latest.$column)";
+    }
+    $updates[] = "$latest.status_id = GREATEST($latest.status_id, VALUES(status_id))";
+
+    $columnList = implode(', ', $columns);
+    $stmt = $pdo->prepare("INSERT INTO $latest (parking_layer, status_id, $columnList)
+        SELECT :layer, id, $columnList FROM $tableName WHERE id = :id
+        ON DUPLICATE KEY UPDATE " . implode(', ', $updates));
+    $stmt->execute([
+        ':layer' => $layer,
+        ':id' => $statusId
+    ]);
+}
+?>
@@ -38,19 +38,23 @@ $floorCode = strtoupper($floorCode);
 try {
     // 引入数据库连接
     require_once 'includes/db.php';
+    require_once 'includes/latest_status.php';
+    require_once 'includes/free_bitmap.php';
     
     // 根据楼层选择对应的表
     $tableName = 'parking_status_' . strtolower($floorCode);
     
-    // 查询楼层数据
-    $query = "SELECT * FROM $tableName ORDER BY timestamp DESC LIMIT 1";
-    $result = executeQuery($query);
-    
-    if (!$result['success']) {
-        throw new Exception("获取车位数据失败: " . $result['message']);
+    $pdo = getDBConnection();
+    if (!$pdo) {
+        throw new Exception("获取车位数据失败: 数据库连接失败");
     }
     
-    $parkingData = $result['data']->fetch();
+    // 查询楼层数据（按主键读取最新状态快照）
+    try {
+        $parkingData = fetchLatestStatus($pdo, $tableName);
+    } catch (PDOException $e) {
+        throw new Exception("获取车位数据失败: " . $e->getMessage());
+    }
     
     if (!$parkingData) {
         throw new Exception("找不到车位数据");
@@ -69,6 +73,12 @@ try {
         $freePositions = [];
     }
     
+    // 空闲车位位图，逐车位查询为O(1)；旧记录没有位图时由空闲位置列表生成
+    $freeBitmap = $parkingData['free_bitmap'] ?? null;
+    if ($freeBitmap === null || $freeBitmap === '') {
+        $freeBitmap = encodeFreeBitmap($freePositions, $totalSlots);
+    }
+    
     // 解析预约信息JSON
     $reservations = json_decode($parkingData['reservation'], true);
     if (!is_array($reservations) && !is_object($reservations)) {
@@ -128,8 +138,8 @@ try {
                 }
             }
             
-            // 如果没有预约，再检查是否在空闲位置列表中
-            if (!$isReserved && (in_array($position, $freePositions) || in_array((string)$position, $freePositions))) {
+            // 如果没有预约，再检查空闲车位位图
+            if (!$isReserved && isSlotFreeInBitmap($freeBitmap, $position)) {
                 $status = 'free';
             }
             
@@ -20,6 +20,8 @@ function logError($message) {
 
 // 加载数据库配置
 require_once __DIR__ . '/includes/config.php';
+require_once __DIR__ . '/includes/latest_status.php';
+require_once __DIR__ . '/includes/free_bitmap.php';
 
 // 获取请求方法
 $method = $_SERVER['REQUEST_METHOD'];
@@ -70,9 +72,7 @@ try {
                 }
                 
                 // 获取最新的停车状态记录
-                $stmt = $pdo->prepare("SELECT * FROM $checkTableName ORDER BY id DESC LIMIT 1");
-                $stmt->execute();
-                $checkStatus = $stmt->fetch(PDO::FETCH_ASSOC);
+                $checkStatus = fetchLatestStatus($pdo, $checkTableName);
                 
                 if (!$checkStatus || empty($checkStatus['reservation']) || $checkStatus['reservation'] === 'NULL') {
                     continue; // 跳过没有预约的楼层
@@ -98,9 +98,7 @@ try {
             }
             
             // 获取最新的停车状态记录
-            $stmt = $pdo->prepare("SELECT * FROM $tableName ORDER BY id DESC LIMIT 1");
-            $stmt->execute();
-            $parkingStatus = $stmt->fetch(PDO::FETCH_ASSOC);
+            $parkingStatus = fetchLatestStatus($pdo, $tableName);
             
             if (!$parkingStatus) {
                 throw new Exception("未找到停车数据, 表: $tableName");
@@ -159,7 +157,8 @@ try {
                     parking_rows,
                     parking_columns,
                     reservation,
-                    source_type
+                    source_type,
+                    free_bitmap
                 ) VALUES (
                     NOW(),
                     :total_slots,
@@ -168,7 +167,8 @@ try {
                     :parking_rows,
                     :parking_columns,
                     :reservation,
-                    :source_type
+                    :source_type,
+                    :free_bitmap
                 )");
                     
                 $stmt->execute([
@@ -178,9 +178,13 @@ try {
                     ':parking_rows' => $parkingStatus['parking_rows'],
                     ':parking_columns' => $parkingStatus['parking_columns'],
                     ':reservation' => json_encode($reservations),
-                    ':source_type' => $parkingStatus['source_type']
+                    ':source_type' => $parkingStatus['source_type'],
+                    ':free_bitmap' => encodeFreeBitmap($freePositions, intval($parkingStatus['total_slots']))
                 ]);
                 
+                // 同一事务中更新最新状态快照
+                updateLatestStatus($pdo, $tableName, $pdo->lastInsertId());
+                
                 // 检查reservation_history表是否存在，如果不存在则创建
                 $stmt = $pdo->query("SHOW TABLES LIKE 'reservation_history'");
                 if ($stmt->rowCount() == 0) {
@@ -244,9 +248,7 @@ try {
             }
             
             // 获取最新的停车状态记录
-            $stmt = $pdo->prepare("SELECT * FROM $tableName ORDER BY id DESC LIMIT 1");
-            $stmt->execute();
-            $parkingStatus = $stmt->fetch(PDO::FETCH_ASSOC);
+            $parkingStatus = fetchLatestStatus($pdo, $tableName);
             
             if (!$parkingStatus) {
                 throw new Exception('未找到停车数据');
@@ -295,7 +297,8 @@ try {
                     parking_rows,
                     parking_columns,
                     reservation,
-                    source_type
+                    source_type,
+                    free_bitmap
                 ) VALUES (
                     NOW(),
                     :total_slots,
@@ -304,7 +307,8 @@ try {
                     :parking_rows,
                     :parking_columns,
                     :reservation,
-                    :source_type
+                    :source_type,
+                    :free_bitmap
                 )");
                     
                 $stmt->execute([
@@ -314,9 +318,13 @@ try {
                     ':parking_rows' => $parkingStatus['parking_rows'],
                     ':parking_columns' => $parkingStatus['parking_columns'],
                     ':reservation' => json_encode($reservations),
-                    ':source_type' => $parkingStatus['source_type']
+                    ':source_type' => $parkingStatus['source_type'],
+                    ':free_bitmap' => encodeFreeBitmap($freePositions, intval($parkingStatus['total_slots']))
                 ]);
                 
+                // 同一事务中更新最新状态快照
+                updateLatestStatus($pdo, $tableName, $pdo->lastInsertId());
+                
                 // 记录取消预约历史
                 $stmt = $pdo->prepare("INSERT INTO reservation_history (table_name, slot_number, phone, action) 
                     VALUES (:table_name, :slot_number, :phone, 'cancel')");
@@ -362,9 +370,7 @@ try {
                 }
                 
                 // 获取最新的停车状态记录
-                $stmt = $pdo->prepare("SELECT * FROM $tableName ORDER BY id DESC LIMIT 1");
-                $stmt->execute();
-                $parkingStatus = $stmt->fetch(PDO::FETCH_ASSOC);
+                $parkingStatus = fetchLatestStatus($pdo, $tableName);
                 
                 if (!$parkingStatus || empty($parkingStatus['reservation']) || $parkingStatus['reservation'] === 'NULL') {
                     continue; // 跳过没有预约的楼层